@@ -1 +1,16 @@
-from .server import Server
+import time
+
+IMPORT_START = time.perf_counter()
+
+
+# Server and main are loaded on first access, so `mcsrv dir` doesn't pay for importing everything behind them
+def __getattr__(name: str):
+    if name == "Server":
+        from .server import Server
+        return Server
+
+    if name == "main":
+        from .cli import main
+        return main
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
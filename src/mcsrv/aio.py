@@ -0,0 +1,221 @@
+import asyncio
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional, Union, TYPE_CHECKING
+
+from .console import ResponseMatcher
+from .rcon import RconChannel, RconError
+from .server import Server
+from .util import Screen, ScreenRegistry
+
+if TYPE_CHECKING:
+    import psutil
+
+
+class AsyncScreen:
+    def __init__(self, screen: Screen):
+        self.screen: Screen = screen
+
+    async def _run(self, *args: str) -> int:
+        proc = await asyncio.create_subprocess_exec("screen", "-S", str(self.screen), "-p", "0", *args,
+                                                    stdout=asyncio.subprocess.DEVNULL,
+                                                    stderr=asyncio.subprocess.DEVNULL)
+        return await proc.wait()
+
+    async def send_commands(self, cmds: Iterable[str]) -> None:
+        await self._run("-X", "stuff", "".join(f"{cmd}^M" for cmd in cmds))
+
+
+class AsyncServer:
+    """
+    Asynchronous counterpart of the console and process operations of a `Server`
+
+    Subprocesses are spawned with asyncio, and log reads and RCON calls run in the default executor, so many servers
+    can be operated on concurrently from a single thread.
+    """
+    EXIT_POLL_INTERVAL = .2
+    TERMINATE_TIMEOUT = 10.0
+    KILL_TIMEOUT = 5.0
+
+    def __init__(self, server: Server):
+        self.server: Server = server
+
+    @property
+    def id(self) -> str:
+        return self.server.id
+
+    @property
+    def running(self) -> bool:
+        return self.server.running
+
+    @property
+    def screen(self) -> Optional[AsyncScreen]:
+        handle = self.server.screen_handle
+        return AsyncScreen(handle) if handle else None
+
+    async def start(self, ram: str = None) -> None:
+        proc = await asyncio.create_subprocess_exec(*self.server.get_start_command(ram), cwd=self.server.path)
+        await proc.wait()
+        ScreenRegistry.invalidate()
+
+    async def send(self, *commands: str) -> None:
+        console = self.server.console
+
+        if isinstance(console, RconChannel):
+            await asyncio.get_running_loop().run_in_executor(None, console.send, *commands)
+            return
+
+        screen = self.screen
+
+        if screen is None:
+            raise RuntimeError(f"server {self.id!r} is not running")
+
+        await screen.send_commands(commands)
+
+    async def request(self, *commands: str, timeout: float = 2.0,
+                      until: Union[str, re.Pattern, None] = None) -> list[str]:
+        console = self.server.console
+
+        if isinstance(console, RconChannel):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, lambda: console.request(*commands, timeout=timeout, until=until))
+
+        loop = asyncio.get_running_loop()
+        matcher = ResponseMatcher(until, console.QUIET_PERIOD)
+        lock = console.lock
+
+        # the lock is shared with the blocking requests to this server from any thread, so it is polled instead of
+        # blocking the event loop
+        while not lock.acquire(blocking=False):
+            await asyncio.sleep(console.POLL_INTERVAL)
+
+        try:
+            offset = await loop.run_in_executor(None, console.log_size)
+            await self.send(*commands)
+            deadline = time.monotonic() + timeout
+
+            while time.monotonic() < deadline:
+                lines, offset = await loop.run_in_executor(None, console.read_lines, offset)
+
+                if matcher.feed(lines):
+                    break
+
+                await asyncio.sleep(console.POLL_INTERVAL)
+
+            return matcher.lines
+        finally:
+            lock.release()
+
+    def processes(self) -> list["psutil.Process"]:
+        """
+        :return: the screen session of the server and all processes started in it
+        """
+        import psutil
+
+        screen = self.server.screen_handle
+
+        if screen is None:
+            return []
+
+        try:
+            proc = psutil.Process(screen.pid)
+            return [proc, *proc.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return []
+
+    @staticmethod
+    def _is_alive(proc: "psutil.Process") -> bool:
+        import psutil
+
+        try:
+            return proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+    async def _wait_gone(self, procs: list["psutil.Process"], timeout: float) -> list["psutil.Process"]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            procs = [p for p in procs if self._is_alive(p)]
+
+            if not procs or time.monotonic() >= deadline:
+                return procs
+
+            await asyncio.sleep(self.EXIT_POLL_INTERVAL)
+
+    @staticmethod
+    def _signal(procs: list["psutil.Process"], kill: bool) -> None:
+        import psutil
+
+        # the java process is signalled before screen, so its shutdown hooks get a chance to save the world
+        for proc in reversed(procs):
+            try:
+                proc.kill() if kill else proc.terminate()
+            except psutil.NoSuchProcess:
+                pass
+
+    async def stop(self, wait: bool = False, timeout: float = 60.0) -> Optional[tuple[str, float]]:
+        """
+        Sends `stop` to the server
+
+        :param wait: wait until all processes of the server are gone. Processes still running after `timeout` seconds
+            are sent SIGTERM, then SIGKILL.
+        :return: if waiting, how the server stopped ("stopped", "terminated" or "killed") and how long it took
+        """
+        procs = self.processes() if wait else []
+        begin = time.monotonic()
+
+        self.server.mark_stop_requested()
+
+        try:
+            await self.send("stop")
+        except (OSError, RconError):
+            # the server may close the rcon connection while shutting down, before the reply arrives
+            pass
+        ScreenRegistry.invalidate()
+
+        if not wait:
+            return None
+
+        result = "stopped"
+        alive = await self._wait_gone(procs, timeout)
+
+        if alive:
+            result = "terminated"
+            self._signal(alive, kill=False)
+            alive = await self._wait_gone(alive, self.TERMINATE_TIMEOUT)
+
+        if alive:
+            result = "killed"
+            self._signal(alive, kill=True)
+            await self._wait_gone(alive, self.KILL_TIMEOUT)
+
+        ScreenRegistry.invalidate()
+
+        return result, time.monotonic() - begin
+
+
+async def gather_servers(servers: Iterable[Server], func: Callable[[AsyncServer], Awaitable[Any]],
+                         limit: Optional[int] = None) -> list[tuple[Server, Any]]:
+    """
+    Runs `func` for all servers concurrently
+
+    :param limit: maximum number of servers operated on at the same time
+    :return: the servers with their results, or the exception raised for them
+    """
+    semaphore = asyncio.Semaphore(limit or (os.cpu_count() or 1) * 8)
+
+    async def run(server: Server) -> Any:
+        async with semaphore:
+            return await func(AsyncServer(server))
+
+    servers = list(servers)
+    results = await asyncio.gather(*(run(s) for s in servers), return_exceptions=True)
+
+    return list(zip(servers, results))
+
+
+def run_all(servers: Iterable[Server], func: Callable[[AsyncServer], Awaitable[Any]],
+            limit: Optional[int] = None) -> list[tuple[Server, Any]]:
+    return asyncio.run(gather_servers(servers, func, limit))
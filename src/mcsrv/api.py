@@ -0,0 +1,57 @@
+from typing import Any
+
+from flask import Flask, Response, abort, jsonify
+
+from .client import DaemonError, DaemonUnavailable, daemon_request
+
+app = Flask(__name__)
+
+_service = None
+
+
+def call(method: str, **params) -> Any:
+    """
+    Calls a method of mcsrvd, or of an in-process service if the daemon isn't running
+    """
+    try:
+        return daemon_request(method, **params)
+    except DaemonUnavailable:
+        pass
+
+    return get_service().call(method, params)
+
+
+def get_service():
+    global _service
+
+    if _service is None:
+        from .daemon import Service
+        _service = Service()
+        _service.sampler.start()
+
+    return _service
+
+
+@app.route("/api/servers")
+def servers():
+    return jsonify(call("servers"))
+
+
+@app.route("/api/servers/<server_id>")
+def server(server_id: str):
+    try:
+        return jsonify(call("server", server_id=server_id))
+    except (DaemonError, KeyError):
+        abort(404)
+
+
+@app.route("/api/java")
+def java():
+    return jsonify([{"version": v, "path": p} for v, p in call("java")])
+
+
+@app.route("/metrics")
+def metrics():
+    from .exporter import CONTENT_TYPE, render_metrics
+
+    return Response(render_metrics(get_service()), content_type=CONTENT_TYPE)
@@ -0,0 +1,259 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import time
+from typing import BinaryIO, Iterator, Optional
+
+from .memory import ram_to_bytes
+
+CACHE_DIR = pathlib.Path(os.environ.get("MCSRV_CACHE_DIR", "~/.mcsrvcache")).expanduser()
+CACHE_SIZE = os.environ.get("MCSRV_CACHE_SIZE", "4G")
+MANIFEST = "manifest.json"
+CONFIG_FILES = ("server.properties", "eula.txt", "user_jvm_args.txt")
+UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._+-]")
+
+
+def _key_part(value: str) -> str:
+    part = UNSAFE_CHARS.sub("_", value)
+    return f"_{part}" if part in ("", ".", "..") else part
+
+
+def _hash_copy(src: BinaryIO, target: pathlib.Path) -> str:
+    h = hashlib.sha256()
+
+    with target.open("wb") as dst:
+        while block := src.read(1024 * 1024):
+            h.update(block)
+            dst.write(block)
+
+    return h.hexdigest()
+
+
+def snapshot_dir(path: pathlib.Path) -> dict[str, tuple[int, int]]:
+    """
+    :return: dict of the relative paths of all files in the directory and their (size, mtime)
+    """
+    out = {}
+
+    for root, _, files in os.walk(path):
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            out[os.path.relpath(os.path.join(root, name), path)] = (st.st_size, st.st_mtime_ns)
+
+    return out
+
+
+class ArtifactCache:
+    """
+    Cache of the files dispensed for a server version, keyed by (software, major, minor)
+
+    An entry holds the files that were dispensed into an empty directory, together with their sha256, so creating or
+    updating another server of the same version only copies files. The manifest mtime of an entry is updated on every
+    use, and the least recently used entries are evicted when the cache grows beyond `max_size`.
+    """
+
+    def __init__(self, root: pathlib.Path = CACHE_DIR, max_size: Optional[int] = None):
+        self.root: pathlib.Path = root
+        self.max_size: int = ram_to_bytes(CACHE_SIZE) if max_size is None else max_size
+
+    def entry_path(self, version: tuple[str, str, str]) -> pathlib.Path:
+        return self.root.joinpath(*map(_key_part, version))
+
+    @contextlib.contextmanager
+    def _lock(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        with self.root.joinpath(".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load(self, version: tuple[str, str, str]) -> Optional[dict]:
+        try:
+            with self.entry_path(version).joinpath(MANIFEST).open("r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def __contains__(self, version: tuple[str, str, str]) -> bool:
+        return self.load(version) is not None
+
+    def entries(self) -> list[tuple[pathlib.Path, dict, float]]:
+        """
+        :return: list of the entry directories, their manifest and the time they were last used
+        """
+        out = []
+
+        for manifest_path in self.root.glob(f"*/*/*/{MANIFEST}"):
+            if manifest_path.parent.name.startswith("."):
+                continue
+
+            try:
+                with manifest_path.open("r") as f:
+                    manifest = json.load(f)
+
+                out.append((manifest_path.parent, manifest, manifest_path.stat().st_mtime))
+            except (OSError, ValueError):
+                continue
+
+        return out
+
+    def put(self, version: tuple[str, str, str], server_path: pathlib.Path,
+            before: dict[str, tuple[int, int]]) -> Optional[dict]:
+        """
+        Stores the files of a server that were added or changed since `before` was taken
+
+        :param before: `snapshot_dir` of the server directory before dispensing
+        :return: the manifest of the new entry, None if there was nothing to store
+        """
+        after = snapshot_dir(server_path)
+        changed = sorted(p for p, st in after.items() if before.get(p) != st and not p.startswith(".mcsrv"))
+
+        if not changed:
+            return None
+
+        entry = self.entry_path(version)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        files = {}
+
+        for rel in changed:
+            source = server_path.joinpath(rel)
+            target = tmp.joinpath("files", rel)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with source.open("rb") as src:
+                files[rel] = [_hash_copy(src, target), os.stat(source).st_size, os.stat(source).st_mode & 0o777]
+
+        manifest = {"version": list(version), "files": files, "size": sum(f[1] for f in files.values()),
+                    "created": time.time()}
+
+        with tmp.joinpath(MANIFEST).open("w") as f:
+            json.dump(manifest, f, indent=2)
+
+        with self._lock():
+            shutil.rmtree(entry, ignore_errors=True)
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, entry)
+            self.evict(keep=entry)
+
+        return manifest
+
+    def restore(self, version: tuple[str, str, str], server_path: pathlib.Path,
+                overwrite: Optional[set[str]] = None) -> bool:
+        """
+        Copies the cached files of a version into a server directory, verifying their checksums
+
+        An entry with a missing or corrupt file is removed and nothing is left behind in the server directory. Errors
+        writing into the server directory are raised and keep the entry.
+
+        :param overwrite: if given, existing files are only replaced if their relative path is in it
+        :return: whether the version was cached and restored
+        """
+        manifest = self.load(version)
+
+        if manifest is None:
+            return False
+
+        entry = self.entry_path(version)
+        written = []
+
+        try:
+            for rel, (digest, _, mode) in manifest["files"].items():
+                target = server_path.joinpath(rel)
+
+                if overwrite is not None and rel not in overwrite and target.exists():
+                    continue
+
+                try:
+                    source = entry.joinpath("files", rel).open("rb")
+                except FileNotFoundError:
+                    raise ValueError(f"missing cached file {rel}")
+
+                with source:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = target.with_name(f".{target.name}.mcsrvcache")
+                    written.append((tmp, target))
+
+                    if _hash_copy(source, tmp) != digest:
+                        raise ValueError(f"corrupt cached file {rel}")
+
+                os.chmod(tmp, mode)
+        except ValueError:
+            for tmp, _ in written:
+                tmp.unlink(missing_ok=True)
+
+            with self._lock():
+                shutil.rmtree(entry, ignore_errors=True)
+
+            return False
+        except BaseException:
+            # errors writing into the server directory don't mean that the entry is broken
+            for tmp, _ in written:
+                tmp.unlink(missing_ok=True)
+
+            raise
+
+        for tmp, target in written:
+            os.replace(tmp, target)
+
+        os.utime(entry.joinpath(MANIFEST))
+        return True
+
+    def evict(self, keep: Optional[pathlib.Path] = None) -> list[pathlib.Path]:
+        """
+        Removes the least recently used entries until the cache fits into `max_size`
+
+        :param keep: an entry that is never removed
+        :return: the removed entries
+        """
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(manifest["size"] for _, manifest, _ in entries)
+        removed = []
+
+        for path, manifest, _ in entries:
+            if total <= self.max_size:
+                break
+
+            if path == keep:
+                continue
+
+            shutil.rmtree(path, ignore_errors=True)
+            total -= manifest["size"]
+            removed.append(path)
+
+        return removed
+
+
+def update_from_cache(cache: ArtifactCache, old: tuple[str, str, str], new: tuple[str, str, str],
+                      server_path: pathlib.Path) -> bool:
+    """
+    Replaces the files of the old version of a server by the ones of the new version, if both are cached
+
+    Only files that were dispensed for the old version are overwritten or deleted, so configs and worlds stay untouched.
+
+    :return: whether the server was updated
+    """
+    old_manifest = cache.load(old)
+    new_manifest = cache.load(new)
+
+    if old_manifest is None or new_manifest is None:
+        return False
+
+    old_files = set(old_manifest["files"]) - set(CONFIG_FILES)
+
+    if not cache.restore(new, server_path, old_files):
+        return False
+
+    for rel in old_files - set(new_manifest["files"]):
+        server_path.joinpath(rel).unlink(missing_ok=True)
+
+    return True
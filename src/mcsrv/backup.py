@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import pathlib
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, TYPE_CHECKING
+
+from .rcon import RconError
+from .world import HEADER_SIZE, chunk_boundaries, get_world_dirs
+
+if TYPE_CHECKING:
+    from .console import ConsoleChannel
+    from .server import Server
+
+BACKUP_DIR = pathlib.Path(os.environ.get("MCSRV_BACKUP_DIR", "~/.mcsrvbackups")).expanduser()
+BLOCK_SIZE = 4 * 1024 * 1024
+SAVE_TIMEOUT = 120.0
+
+
+def _object_path(objects: pathlib.Path, digest: str) -> pathlib.Path:
+    return objects.joinpath(digest[:2], digest[2:])
+
+
+def _split(path: pathlib.Path, data: bytes) -> list[bytes]:
+    # region files are split at chunk boundaries, so unchanged chunks map to the same objects across snapshots
+    if path.suffix in (".mca", ".mcr") and len(data) >= HEADER_SIZE:
+        bounds = chunk_boundaries(data, len(data)) + [len(data)]
+        return [data[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+
+    return [data[i:i + BLOCK_SIZE] for i in range(0, len(data), BLOCK_SIZE)] or [b""]
+
+
+def store_file(path: str, objects: str) -> list[str]:
+    """
+    Splits a file into pieces and writes the pieces that aren't in the store yet, compressed
+
+    :return: the sha256 digests of the pieces in file order
+    """
+    objects_dir = pathlib.Path(objects)
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    out = []
+
+    for piece in _split(pathlib.Path(path), data):
+        digest = hashlib.sha256(piece).hexdigest()
+        target = _object_path(objects_dir, digest)
+        out.append(digest)
+
+        if target.exists():
+            continue
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+
+        with tmp.open("wb") as f:
+            f.write(zlib.compress(piece, 6))
+
+        os.replace(tmp, target)
+
+    return out
+
+
+def restore_file(target: str, objects: str, blobs: list[str], mode: int) -> None:
+    objects_dir = pathlib.Path(objects)
+    target_path = pathlib.Path(target)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target_path.with_name(f".{target_path.name}.mcsrvrestore")
+
+    with tmp.open("wb") as f:
+        for digest in blobs:
+            with _object_path(objects_dir, digest).open("rb") as obj:
+                piece = zlib.decompress(obj.read())
+
+            if hashlib.sha256(piece).hexdigest() != digest:
+                raise ValueError(f"corrupt backup object {digest}")
+
+            f.write(piece)
+
+    os.chmod(tmp, mode)
+    os.replace(tmp, target_path)
+
+
+class BackupStore:
+    """
+    Content-addressed store of world snapshots
+
+    Files are split into pieces (region files at their chunk boundaries) which are stored once, compressed and named by
+    their sha256, in a store shared by all servers. A snapshot is a manifest listing the pieces of every file. Files
+    whose size and mtime didn't change since the previous snapshot are taken over without being read.
+    """
+
+    def __init__(self, server_id: str, root: pathlib.Path = BACKUP_DIR):
+        self.server_id: str = server_id
+        self.objects: pathlib.Path = root.joinpath("objects")
+        self.snapshots_dir: pathlib.Path = root.joinpath(server_id, "snapshots")
+
+    def snapshots(self) -> list[str]:
+        if not self.snapshots_dir.is_dir():
+            return []
+
+        return sorted(p.stem for p in self.snapshots_dir.glob("*.json"))
+
+    def load(self, name: Optional[str] = None) -> dict:
+        snapshots = self.snapshots()
+
+        if not snapshots:
+            raise FileNotFoundError(f"no backups of {self.server_id}")
+
+        name = name or snapshots[-1]
+
+        if name not in snapshots:
+            raise FileNotFoundError(f"no backup named {name!r}")
+
+        with self.snapshots_dir.joinpath(f"{name}.json").open("r") as f:
+            return json.load(f)
+
+    def snapshot(self, server_path: pathlib.Path, roots: list[pathlib.Path], workers: Optional[int] = None) -> dict:
+        try:
+            previous = self.load()["files"]
+        except FileNotFoundError:
+            previous = {}
+
+        files = {}
+        to_store = []
+
+        for root in roots:
+            for path in root.rglob("*"):
+                if not path.is_file() or path.name == "session.lock":
+                    continue
+
+                rel = str(path.relative_to(server_path))
+                st = path.stat()
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": st.st_mode & 0o7777}
+                prev = previous.get(rel)
+
+                if prev and prev["size"] == entry["size"] and prev["mtime_ns"] == entry["mtime_ns"]:
+                    entry["blobs"] = prev["blobs"]
+                else:
+                    to_store.append((rel, path))
+
+                files[rel] = entry
+
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(store_file, [str(p) for _, p in to_store], [str(self.objects)] * len(to_store),
+                               chunksize=4)
+
+            for (rel, _), blobs in zip(to_store, results):
+                files[rel]["blobs"] = blobs
+
+        name = time.strftime("%Y%m%d-%H%M%S")
+
+        while self.snapshots_dir.joinpath(f"{name}.json").exists():
+            name += "-1"
+
+        manifest = {
+            "server": self.server_id,
+            "name": name,
+            "created": time.time(),
+            "roots": [str(r.relative_to(server_path)) for r in roots],
+            "files": files,
+            "changed": len(to_store),
+        }
+
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.snapshots_dir.joinpath(f".{manifest['name']}.tmp")
+
+        with tmp.open("w") as f:
+            json.dump(manifest, f)
+
+        os.replace(tmp, self.snapshots_dir.joinpath(f"{manifest['name']}.json"))
+
+        return manifest
+
+    def restore(self, server_path: pathlib.Path, name: Optional[str] = None, workers: Optional[int] = None) -> dict:
+        manifest = self.load(name)
+        files = manifest["files"]
+
+        # remove what has been created since the snapshot
+        for root in manifest["roots"]:
+            root_path = server_path.joinpath(root)
+
+            if not root_path.is_dir():
+                continue
+
+            for path in sorted(root_path.rglob("*"), reverse=True):
+                rel = str(path.relative_to(server_path))
+
+                if path.is_file() and rel not in files:
+                    path.unlink()
+                elif path.is_dir() and not any(path.iterdir()):
+                    path.rmdir()
+
+        to_restore = []
+
+        for rel, entry in files.items():
+            target = server_path.joinpath(rel)
+
+            try:
+                st = target.stat()
+
+                if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                    continue
+            except FileNotFoundError:
+                pass
+
+            to_restore.append((rel, entry))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(restore_file, [str(server_path.joinpath(rel)) for rel, _ in to_restore],
+                          [str(self.objects)] * len(to_restore), [e["blobs"] for _, e in to_restore],
+                          [e["mode"] for _, e in to_restore], chunksize=4))
+
+        for rel, entry in to_restore:
+            os.utime(server_path.joinpath(rel), ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+        return manifest
+
+
+def _request_confirmed(console: "ConsoleChannel", command: str, timeout: float, until: str) -> None:
+    """
+    Sends a console command and raises a RuntimeError if the server didn't confirm it in time
+    """
+    try:
+        lines = console.request(command, timeout=timeout, until=until)
+    except (OSError, RconError) as e:
+        raise RuntimeError(f"{command!r} failed: {e}") from e
+
+    if not any(re.search(until, line) for line in lines):
+        raise RuntimeError(f"the server didn't confirm {command!r} within {timeout:g}s")
+
+
+def backup_server(server: "Server", workers: Optional[int] = None) -> dict:
+    """
+    Snapshots the world of a server. A running server is told to flush its world to disk and to stop saving until the
+    snapshot has been taken.
+    """
+    store = BackupStore(server.id)
+    roots = get_world_dirs(server)
+
+    if not roots:
+        raise FileNotFoundError(f"no world found in {server.path}")
+
+    if not server.running:
+        return store.snapshot(server.path, roots, workers)
+
+    console = server.console
+
+    try:
+        _request_confirmed(console, "save-off", 5.0, "Automatic saving is now disabled|Saving is already turned off")
+        _request_confirmed(console, "save-all flush", SAVE_TIMEOUT, "Saved the game")
+        return store.snapshot(server.path, roots, workers)
+    finally:
+        console.send("save-on")
+
+
+def restore_server(server: "Server", name: Optional[str] = None, workers: Optional[int] = None) -> dict:
+    if server.running:
+        raise RuntimeError("the server must be stopped before restoring a backup")
+
+    return BackupStore(server.id).restore(server.path, name, workers)
@@ -1,41 +1,83 @@
 #!/usr/bin/python3
 import functools
 import os
-from typing import Optional
+import pathlib
+import sys
+import time
+from typing import Any, Optional, TYPE_CHECKING
 
 import click
-import dispenser
-import tabulate
 from click import echo
 from colorama import Fore, Style
 
-from .commands import create, start, start_auto
-from .javaexecutable import JavaExecutable, prompt_java_version
-from .server import Server, ALL_LIST_PROPERTIES
-from .util import format_server_info, format_enabled
+from .client import DaemonError, daemon_request
+from .registry import ServerRegistry
 
+if TYPE_CHECKING:
+    from .server import Server
 
-def get_server(ctx: click.Context) -> Server:
-    return Server(ctx.obj["SERVER_PATH"]).register()
+OUTPUT_FORMATS = ["table", "json", "ndjson", "csv"]
+HEAVY_MODULES = ("asyncio", "dispenser", "flask", "inquirer", "psutil", "tabulate")
 
 
-def pass_server(f):
+def get_server(ctx: click.Context, read_only: bool = False) -> "Server":
+    from .server import Server
+
+    return Server(ctx.obj["SERVER_PATH"], read_only=read_only).register()
+
+
+def pass_server(f=None, *, read_only: bool = False):
+    if f is None:
+        return functools.partial(pass_server, read_only=read_only)
+
     @functools.wraps(f)
     @click.pass_context
     def wrapped(ctx: click.Context, *args, **kwargs):
-        return f(get_server(ctx), *args, **kwargs)
+        return f(get_server(ctx, read_only), *args, **kwargs)
 
     return wrapped
 
 
+def daemon_call(method: str, **params) -> tuple[bool, Any]:
+    """
+    Calls a method of mcsrvd if it is running and enabled
+
+    :return: whether the daemon handled the call, and the result
+    """
+    if not click.get_current_context().find_root().obj.get("USE_DAEMON", True):
+        return False, None
+
+    try:
+        return True, daemon_request(method, **params)
+    except DaemonError:
+        return False, None
+
+
+def print_import_profile(command_start: float) -> None:
+    from . import IMPORT_START
+
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    echo(f"mcsrv: imports took {(command_start - IMPORT_START) * 1000:.1f}ms, "
+         f"command took {(time.perf_counter() - command_start) * 1000:.1f}ms", err=True)
+    echo(f"mcsrv: heavy modules loaded: {', '.join(loaded) or 'none'}", err=True)
+
+
 @click.group(help="Control your Minecraft Servers with ease!")
 @click.option("--dir", "-p", "server_path", help="Set the directory in which to search for the server",
               default=os.getcwd(),
               type=click.Path(exists=True, file_okay=False, dir_okay=True))
+@click.option("--no-daemon", "no_daemon", help="Don't use a running mcsrvd", is_flag=True, default=False,
+              envvar="MCSRV_NO_DAEMON")
+@click.option("--profile-import", "profile_import", help="Print the startup time and the heavy dependencies loaded",
+              is_flag=True, default=False)
 @click.pass_context
-def main(ctx: click.Context, server_path: str):
+def main(ctx: click.Context, server_path: str, no_daemon: bool, profile_import: bool):
     ctx.ensure_object(dict)
     ctx.obj["SERVER_PATH"] = server_path
+    ctx.obj["USE_DAEMON"] = not no_daemon
+
+    if profile_import:
+        ctx.call_on_close(functools.partial(print_import_profile, time.perf_counter()))
 
 
 @main.command(name="create", help="Create a new server")
@@ -43,13 +85,19 @@ def main(ctx: click.Context, server_path: str):
 @click.argument("version", type=click.STRING, required=False, nargs=-1)
 @click.option("--interactive", "-i", "interactive", is_flag=True, default=True)
 @click.option("--newest", "-n", "newest", is_flag=True, default=False)
-def create_cmd(name: str, version: tuple[str], interactive: bool, newest: bool):
-    create(name, version, interactive, newest)
+@click.option("--dedupe", "dedupe", help="Share the jars and libraries with other Servers through the store",
+              is_flag=True, default=False)
+def create_cmd(name: str, version: tuple[str], interactive: bool, newest: bool, dedupe: bool):
+    from .commands import create
+
+    create(name, version, interactive, newest, dedupe)
 
 
 @main.group(name="update", help="Update the server")
+@click.option("--dedupe", "dedupe", help="Share the new jars and libraries with other Servers through the store",
+              is_flag=True, default=False)
 @pass_server
-def update(server: Server):
+def update(server: "Server", dedupe: bool):
     if server.version is None:
         server.print("updating is only supported on servers created using mcsrv")
         raise click.exceptions.Exit(code=-1)
@@ -58,21 +106,35 @@ def update(server: Server):
         server.print("server must be stopped before updating")
         raise click.exceptions.Exit(code=-1)
 
-    dispenser.init()
+    from .store import unshare
+
+    # the update may overwrite files in place, which must not reach the other servers sharing them
+    unshare(server.path)
+
+
+@update.result_callback()
+@click.pass_context
+def update_done(ctx: click.Context, _, dedupe: bool):
+    if dedupe:
+        print_dedupe_result(get_server(ctx, read_only=True))
 
 
 @update.command(name="major", help="Update major version")
 @click.argument("new_major", type=click.STRING, required=False, nargs=1)
 @pass_server
-def update_major(server: Server, new_major: Optional[str]):
-    server.version = dispenser.update_major(server.data["software"], server.path, new_major)
+def update_major(server: "Server", new_major: Optional[str]):
+    from .commands import get_newest_major, update as update_server
+
+    update_server(server, new_major or get_newest_major(server.data["software"]), None)
 
 
 @update.command(name="minor", help="Update minor version")
 @click.argument("new_minor", type=click.STRING, required=False, nargs=1)
 @pass_server
-def update_minor(server: Server, new_minor: Optional[str]):
-    server.version = dispenser.update_minor(server.data["software"], server.path, server.data["major"], new_minor)
+def update_minor(server: "Server", new_minor: Optional[str]):
+    from .commands import update as update_server
+
+    update_server(server, None, new_minor)
 
 
 @main.group(name="start", help="Start the Server", invoke_without_command=True)
@@ -82,34 +144,141 @@ def update_minor(server: Server, new_minor: Optional[str]):
               type=click.STRING)
 @click.option("--console", "-c", "open_console", help="Attach to the servers console after start", is_flag=True,
               default=False)
-@pass_server
+@click.option("--headroom", "headroom", help="Memory that must stay available after the start",
+              default=None, envvar="MCSRV_MEMORY_HEADROOM", type=click.STRING)
+@click.option("--force", "force", help="Skip the memory and port collision checks", is_flag=True,
+              default=False)
 @click.pass_context
-def start_cmd(ctx, server: Server, ram_: str, open_console: bool):
+def start_cmd(ctx, ram_: str, open_console: bool, headroom: str, force: bool):
     if ctx.invoked_subcommand is not None:
         return
 
-    start(server, ram_, open_console)
+    from .commands import start
+    from .memory import DEFAULT_HEADROOM
+
+    start(get_server(ctx), ram_, open_console, headroom or DEFAULT_HEADROOM, force)
 
 
 @start_cmd.command(name="auto", help="Start all Servers that should be autostarted")
-def start_auto_cmd():
-    start_auto()
+@click.option("--workers", "-w", "workers", help="How many servers are started at the same time", type=click.IntRange(1),
+              default=4)
+@click.option("--stagger", "-s", "stagger", help="Minimum seconds between two server starts", type=click.FLOAT,
+              default=0.0)
+@click.option("--headroom", "headroom", help="Memory that must stay available after each start",
+              default=None, envvar="MCSRV_MEMORY_HEADROOM", type=click.STRING)
+@click.option("--memory-timeout", "memory_timeout", help="Seconds a start waits for memory before it is skipped",
+              type=click.FLOAT, default=300.0)
+@click.option("--force", "force", help="Skip the memory and port collision checks", is_flag=True,
+              default=False)
+def start_auto_cmd(workers: int, stagger: float, headroom: str, memory_timeout: float, force: bool):
+    from .commands import start_auto
+    from .memory import DEFAULT_HEADROOM
+
+    start_auto(workers, stagger, None if force else headroom or DEFAULT_HEADROOM, memory_timeout,
+               check_ports=not force)
+
+
+def get_running_servers() -> list["Server"]:
+    from .server import Server
+
+    return [s for s in Server.get_registered_servers(read_only=True) if s.running]
+
+
+def print_fleet_errors(results: list[tuple["Server", Any]]) -> None:
+    for server, result in results:
+        if isinstance(result, Exception):
+            server.print(f"{Fore.RED}{result}")
+
+
+def print_stop_result(server: "Server", result: Optional[tuple[str, float]]) -> None:
+    if result is None:
+        server.print("Stopping...")
+        return
+
+    how, duration = result
+    color = {"stopped": Fore.GREEN, "terminated": Fore.YELLOW, "killed": Fore.RED}[how]
+    server.print(f"{color}{how.capitalize()}{Fore.RESET} after {duration:.1f}s")
 
 
 @main.command(name="stop", help="Stop the Server")
-@pass_server
-def stop(server: Server):
+@click.option("--all", "-a", "all_", help="Stop all running Servers", is_flag=True, default=False)
+@click.option("--wait", "-w", "wait", help="Wait until the Server processes have exited", is_flag=True, default=False)
+@click.option("--timeout", "-t", "timeout", help="Seconds to wait before the Server is terminated, then killed",
+              type=click.FLOAT, default=60.0)
+@click.pass_context
+def stop(ctx: click.Context, all_: bool, wait: bool, timeout: float):
+    import asyncio
+
+    from .aio import AsyncServer, run_all
+
+    if all_:
+        results = run_all(get_running_servers(), lambda s: s.stop(wait, timeout))
+
+        for server, result in results:
+            if not isinstance(result, Exception):
+                print_stop_result(server, result)
+
+        print_fleet_errors(results)
+        return
+
+    server = get_server(ctx, read_only=True)
+
     if not server.running:
         server.print(f"{Fore.YELLOW}Server is not running")
         return
 
-    server.stop()
+    if not wait:
+        asyncio.run(AsyncServer(server).stop())
+        server.print("Stopping...")
+        return
+
     server.print("Stopping...")
+    print_stop_result(server, asyncio.run(AsyncServer(server).stop(wait, timeout)))
+
+
+@main.command(name="exec", help="Execute a command on the Server console and print its output")
+@click.argument("command", type=click.STRING, required=True, nargs=-1)
+@click.option("--timeout", "-t", "timeout", help="Seconds to wait for output", type=click.FLOAT, default=2.0)
+@click.option("--all", "-a", "all_", help="Execute the command on all running Servers", is_flag=True, default=False)
+@click.pass_context
+def exec_(ctx: click.Context, command: tuple[str], timeout: float, all_: bool):
+    if all_:
+        from .aio import run_all
+
+        results = run_all(get_running_servers(), lambda s: s.request(" ".join(command), timeout=timeout))
+
+        for server, result in results:
+            if not isinstance(result, Exception):
+                for line in result:
+                    server.print(line)
+
+        print_fleet_errors(results)
+        return
+
+    server = get_server(ctx, read_only=True)
+
+    if not server.running:
+        server.print(f"{Fore.YELLOW}Server is not running")
+        raise click.exceptions.Exit(code=1)
+
+    import asyncio
+
+    from .aio import AsyncServer
+    from .rcon import RconError
+
+    try:
+        lines = asyncio.run(AsyncServer(server).request(" ".join(command), timeout=timeout))
+    except (OSError, RconError) as e:
+        server.print(f"{Fore.RED}{e}")
+        raise click.exceptions.Exit(code=1)
+
+    for line in lines:
+        echo(line)
 
 
 @main.command(name="console", help="Open the Server console")
-@pass_server
-def console(server: Server):
+@pass_server(read_only=True)
+def console(server: "Server"):
     if not server.running:
         server.print(f"{Fore.YELLOW}Server needs to be started first")
         return
@@ -118,8 +287,33 @@ def console(server: Server):
 
 
 @main.command(help="Show information about the Server")
-@pass_server
-def info(server: Server):
+@click.option("--format", "output_format", help="Output format", type=click.Choice(OUTPUT_FORMATS), default="table")
+@pass_server(read_only=True)
+def info(server: "Server", output_format: str):
+    from .util import format_server_info, write_records
+
+    if output_format != "table":
+        cpu, ram_ = server.get_stats()
+        record = {
+            "id": server.id,
+            "path": str(server.path),
+            "launch_method": server.launch_method[0],
+            "launch_args": server.launch_method[1],
+            "running": server.running,
+            "screen": str(server.screen_handle) if server.running else None,
+            "allocated_ram": server.ram,
+            "cpu": cpu,
+            "ram": ram_,
+            "autostart": server.autostarts,
+            "java": server.java_executable.version,
+            "players": server.player_count,
+            "restarts": int(server.data.get("restarts", "0")),
+            "last_crash": int(server.data["last-crash"]) if "last-crash" in server.data else None,
+            "crash_loop": server.data.get("crash-loop") == "true",
+        }
+        write_records([record], output_format, list(record))
+        return
+
     server.print("Measuring performance...")
     cpu, ram_ = server.get_stats()
 
@@ -135,27 +329,44 @@ def info(server: Server):
         "RAM-Usage": f"{ram_}GB",
         "Autostart": server.autostarts,
         "Java-Version": server.java_executable,
-        "Player Count": server.player_count
+        "Player Count": server.player_count,
+        "Restarts": server.restart_info,
     }))
 
 
 @main.group(help="Get/Set whether the Server is started with the system", invoke_without_command=True)
 @click.argument("enable", type=click.BOOL, required=False, nargs=1)
+@click.option("--priority", "priority", help="Servers with a higher priority are started first by `start auto`",
+              type=click.INT, default=None)
+@click.option("--delay", "delay", help="Seconds to wait before this server is started by `start auto`",
+              type=click.FLOAT, default=None)
 @pass_server
-def autostart(server: Server, enable: Optional[bool]):
-    if enable is None:
+def autostart(server: "Server", enable: Optional[bool], priority: Optional[int], delay: Optional[float]):
+    from .util import format_enabled
+
+    if enable is None and priority is None and delay is None:
         server.print(
-            f"Autostart is currently {format_enabled(server.data.get('autostart', 'false').lower() == 'true')}")
+            f"Autostart is currently {format_enabled(server.data.get('autostart', 'false').lower() == 'true')} "
+            f"(priority {server.autostart_priority}, delay {server.autostart_delay}s)")
         return
 
-    server.autostarts = enable
-    server.print(f"Autostart has been {format_enabled(enable)}")
+    if enable is not None:
+        server.autostarts = enable
+        server.print(f"Autostart has been {format_enabled(enable)}")
+
+    if priority is not None:
+        server.autostart_priority = priority
+        server.print(f"Autostart priority set to {Style.BRIGHT}{priority}")
+
+    if delay is not None:
+        server.autostart_delay = max(0.0, delay)
+        server.print(f"Autostart delay set to {Style.BRIGHT}{server.autostart_delay}s")
 
 
 @main.command(help="Get/Set how much RAM this Server is allocated")
 @click.argument("ram_value", type=click.STRING, required=False, nargs=1)
 @pass_server
-def ram(server: Server, ram_value: str):
+def ram(server: "Server", ram_value: str):
     if ram_value is None:
         server.print(f"Currently allocated RAM: {Style.BRIGHT}{server.ram}")
         return
@@ -165,22 +376,68 @@ def ram(server: Server, ram_value: str):
     server.print_restart_note()
 
 
+def iter_list_records(servers: list["Server"], props: str, workers: int = 8):
+    """
+    Computes the list records of the servers concurrently and yields them in completion order. Performance stats of all
+    servers are measured in a single shared window.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from .stats import collect_stats
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # submitted first, so a worker is measuring before any row waits for it
+        stats = pool.submit(collect_stats, servers) if "x" in props else None
+
+        def record(server: "Server") -> dict:
+            return server.get_list_record(props, stats.result().get(server.id) if stats else None)
+
+        for future in as_completed([pool.submit(record, s) for s in servers]):
+            yield future.result()
+
+
+def print_port_conflicts() -> None:
+    from .ports import PortIndex
+
+    for (port, protocol), owners in sorted(PortIndex().refresh().conflicts().items()):
+        echo(f"mcsrv: {Fore.YELLOW}port {port}/{protocol} is used by {', '.join(owners)}{Style.RESET_ALL}", err=True)
+
+
 @main.command(name="list", help="Get a list of running Servers")
 @click.option("--running", "-r", "only_running", help="List only running Servers", is_flag=True,
               default=False)
 @click.option("--plain", "-f", "plain", help="Plain output", is_flag=True,
               default=False)
-@click.option("--props", "-p", "props", help=f"Specify the props to print ({ALL_LIST_PROPERTIES})", type=click.STRING, default="iproax")
+@click.option("--props", "-p", "props", help="Specify the props to print (ripatxojm)", type=click.STRING, default="iproax")
 @click.option("--all-props", "-a", "all_props", help="Show all props", is_flag=True, default=False)
-def list_(only_running: bool, plain: bool, props: str, all_props: bool):
-    data = []
+@click.option("--format", "output_format", help="Output format, ndjson and csv rows are printed as soon as they are ready",
+              type=click.Choice(OUTPUT_FORMATS), default="table")
+def list_(only_running: bool, plain: bool, props: str, all_props: bool, output_format: str):
+    from .server import ALL_LIST_PROPERTIES, LIST_RECORD_FIELDS, Server
+    from .stats import collect_stats
+    from .util import write_records
 
     if all_props:
         props = ALL_LIST_PROPERTIES
 
-    for server in Server.get_registered_servers():
-        if not only_running or server.running:
-            data.append(server.get_list_data(props, plain))
+    if output_format != "table":
+        fields = [f for p in ALL_LIST_PROPERTIES if p in props for f in LIST_RECORD_FIELDS[p]]
+        handled, records = daemon_call("records", props=props, only_running=only_running)
+
+        if not handled:
+            servers = [s for s in Server.get_registered_servers(read_only=True) if not only_running or s.running]
+            records = iter_list_records(servers, props)
+
+        write_records(records, output_format, fields)
+        print_port_conflicts()
+        return
+
+    handled, data = daemon_call("list", props=props, plain=plain, only_running=only_running)
+
+    if not handled:
+        servers = [s for s in Server.get_registered_servers(read_only=True) if not only_running or s.running]
+        stats = collect_stats(servers) if "x" in props else {}
+        data = [server.get_list_data(props, plain, stats.get(server.id)) for server in servers]
 
     fmt = "plain" if plain else "rounded_outline"
 
@@ -198,7 +455,267 @@ def list_(only_running: bool, plain: bool, props: str, all_props: bool):
 
     headers = [] if plain else [header_names[i] for i in ALL_LIST_PROPERTIES if i in props]
 
+    import tabulate
+
     echo(tabulate.tabulate(data, headers, tablefmt=fmt, numalign="left"))
+    print_port_conflicts()
+
+
+@main.command(name="monitor", help="Record CPU, RAM, threads, open files and players of all running Servers")
+@click.option("--interval", "-i", "interval", help="Seconds between two samples", type=click.FLOAT, default=10.0)
+def monitor(interval: float):
+    from .metrics import METRICS_DIR, MetricsCollector
+
+    echo(f"mcsrv: recording metrics every {interval}s to {METRICS_DIR}")
+
+    try:
+        MetricsCollector(interval).run()
+    except KeyboardInterrupt:
+        pass
+
+
+def get_server_by_id(server_id: str) -> "Server":
+    from .server import Server
+
+    server = Server.get_by_id(server_id, read_only=True)
+
+    if server is None:
+        echo(f"mcsrv: {Fore.RED}Unknown server: {server_id}")
+        raise click.exceptions.Exit(code=1)
+
+    return server
+
+
+@main.command(name="backup", help="Back up the world of a Server")
+@click.argument("server_id", type=click.STRING, required=True, nargs=1)
+@click.option("--workers", "-w", "workers", help="Processes used for hashing and compression",
+              type=click.IntRange(1), default=None)
+def backup(server_id: str, workers: Optional[int]):
+    from .backup import backup_server
+
+    server = get_server_by_id(server_id)
+    begin = time.monotonic()
+
+    try:
+        manifest = backup_server(server, workers)
+    except (FileNotFoundError, RuntimeError) as e:
+        server.print(f"{Fore.RED}{e}")
+        raise click.exceptions.Exit(code=1)
+
+    server.print(f"created backup {Style.BRIGHT}{manifest['name']}{Style.RESET_ALL} "
+                 f"({manifest['changed']} of {len(manifest['files'])} files changed) "
+                 f"in {time.monotonic() - begin:.1f}s")
+
+
+@main.command(name="restore", help="Restore the world of a Server from a backup")
+@click.argument("server_id", type=click.STRING, required=True, nargs=1)
+@click.argument("name", type=click.STRING, required=False, nargs=1)
+@click.option("--list", "-l", "list_backups", help="List the available backups", is_flag=True, default=False)
+@click.option("--workers", "-w", "workers", help="Processes used for decompression", type=click.IntRange(1),
+              default=None)
+def restore(server_id: str, name: Optional[str], list_backups: bool, workers: Optional[int]):
+    from .backup import BackupStore, restore_server
+
+    server = get_server_by_id(server_id)
+
+    if list_backups:
+        for snapshot in BackupStore(server.id).snapshots():
+            echo(snapshot)
+        return
+
+    try:
+        manifest = restore_server(server, name, workers)
+    except (FileNotFoundError, RuntimeError) as e:
+        server.print(f"{Fore.RED}{e}")
+        raise click.exceptions.Exit(code=1)
+
+    server.print(f"restored backup {Style.BRIGHT}{manifest['name']}")
+
+
+@main.group(name="world", help="Inspect the world of a Server")
+def world():
+    pass
+
+
+@world.command(name="stats", help="Show the size of the world and regions that haven't been modified for a while")
+@click.argument("server_id", type=click.STRING, required=True, nargs=1)
+@click.option("--stale", "-s", "stale_days", help="List regions not modified in this many days", type=click.FLOAT,
+              default=None)
+@click.option("--workers", "-w", "workers", help="Threads used for scanning region files", type=click.IntRange(1),
+              default=None)
+def world_stats(server_id: str, stale_days: Optional[float], workers: Optional[int]):
+    import tabulate
+
+    from .world import WorldIndex, get_world_size, summarize_regions
+
+    server = get_server_by_id(server_id)
+    regions = WorldIndex(server).regions(workers)
+
+    rows = [[d, count, chunks, f"{size / 1000000:.1f}MB"] for d, (count, chunks, size) in
+            summarize_regions(regions).items()]
+
+    echo(f"World size: {get_world_size(server) / 1000000000:.2f}GB")
+    echo(tabulate.tabulate(rows, ["Directory", "Regions", "Chunks", "Size"], tablefmt="rounded_outline"))
+
+    if stale_days is None:
+        return
+
+    threshold = time.time() - stale_days * 86400
+    stale = [r for r in regions if r.last_modified < threshold]
+
+    echo(f"{len(stale)} regions not modified in {stale_days:g} days "
+         f"({sum(r.size for r in stale) / 1000000:.1f}MB could be pruned):")
+
+    for region in stale:
+        modified = time.strftime("%Y-%m-%d", time.localtime(region.last_modified)) if region.last_modified else "never"
+        echo(f"  {region.path} ({region.chunks} chunks, last modified {modified})")
+
+
+@main.group(name="logs", help="Manage the logs of Servers")
+def logs():
+    pass
+
+
+@logs.command(name="compact", help="Recompress the logs of past months into one archive per month")
+@click.option("--all", "-a", "all_", help="Compact the logs of all registered Servers", is_flag=True, default=False)
+@click.option("--workers", "-w", "workers", help="Processes used for compression", type=click.IntRange(1),
+              default=None)
+@click.pass_context
+def logs_compact(ctx: click.Context, all_: bool, workers: Optional[int]):
+    from .logs import compact_logs
+
+    paths = ServerRegistry.paths() if all_ else [str(get_server(ctx, read_only=True).path)]
+    begin = time.monotonic()
+    results = compact_logs(paths, workers)
+
+    for result in results:
+        if result.count:
+            echo(f"{result.logs_dir}: {result.month}: {result.count} logs, "
+                 f"{result.before / 1000:.0f}KB -> {result.after / 1000:.0f}KB")
+
+    before = sum(r.before for r in results)
+    after = sum(r.after for r in results)
+    echo(f"Compacted {sum(r.count for r in results)} logs, saved {(before - after) / 1000000:.1f}MB "
+         f"in {time.monotonic() - begin:.1f}s")
+
+
+@logs.command(name="extract", help="Print the logs of a single day (YYYY-MM-DD)")
+@click.argument("date", type=click.STRING, required=True, nargs=1)
+@pass_server(read_only=True)
+def logs_extract(server: "Server", date: str):
+    from .logs import read_day
+
+    found = False
+
+    for _, content in read_day(server.path.joinpath("logs"), date):
+        found = True
+        click.echo(content, nl=False)
+
+    if not found:
+        server.print(f"{Fore.RED}No logs found for {date}")
+        raise click.exceptions.Exit(code=1)
+
+
+def print_dedupe_result(server: "Server", workers: Optional[int] = None) -> None:
+    from .store import SharedStore
+
+    result = SharedStore().dedupe(server.path, workers)
+    server.print(f"{result.linked} of {result.files} files shared, saved {result.saved / 1000000:.1f}MB")
+
+
+@main.command(name="dedupe", help="Share identical jars and libraries between Servers")
+@click.option("--all", "-a", "all_", help="Deduplicate all registered Servers", is_flag=True, default=False)
+@click.option("--prune", "prune", help="Delete files from the store that no Server uses anymore", is_flag=True,
+              default=False)
+@click.option("--workers", "-w", "workers", help="Threads used for hashing", type=click.IntRange(1), default=None)
+@click.pass_context
+def dedupe_cmd(ctx: click.Context, all_: bool, prune: bool, workers: Optional[int]):
+    from .server import Server
+
+    servers = Server.get_registered_servers(read_only=True) if all_ else [get_server(ctx, read_only=True)]
+
+    for server in servers:
+        print_dedupe_result(server, workers)
+
+    if prune:
+        from .store import SharedStore
+
+        count, size = SharedStore().prune()
+        echo(f"mcsrv: removed {count} unused files ({size / 1000000:.1f}MB) from the store")
+
+
+@main.command(name="supervise", help="Restart crashed autostart Servers")
+@click.option("--backoff", "backoff", help="Seconds to wait before the first restart, doubled with every crash",
+              type=click.FLOAT, default=5.0)
+@click.option("--max-backoff", "max_backoff", help="Maximum seconds to wait before a restart", type=click.FLOAT,
+              default=300.0)
+@click.option("--crash-limit", "crash_limit", help="Give up on a Server after this many crashes within the window",
+              type=click.IntRange(1), default=5)
+@click.option("--crash-window", "crash_window", help="Seconds in which crashes are counted", type=click.FLOAT,
+              default=600.0)
+def supervise(backoff: float, max_backoff: float, crash_limit: int, crash_window: float):
+    from .supervisor import Supervisor
+
+    echo("mcsrv: supervising autostart servers")
+
+    try:
+        Supervisor(backoff, max_backoff, crash_limit, crash_window).run()
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command(name="exporter", help="Serve metrics of all Servers for Prometheus")
+@click.option("--host", "-h", "host", type=click.STRING, default="127.0.0.1")
+@click.option("--port", "-p", "port", type=click.INT, default=9225)
+@click.option("--interval", "-i", "interval", help="Seconds between two stats samples", type=click.FLOAT,
+              default=15.0)
+def exporter(host: str, port: int, interval: float):
+    from .daemon import Service
+    from .exporter import serve
+
+    service = Service(interval)
+    service.sampler.start()
+
+    echo(f"mcsrv: serving metrics on http://{host}:{port}/metrics")
+
+    try:
+        serve(service, host, port)
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command(name="stats", help="Show recorded metrics of a Server")
+@click.argument("server_id", type=click.STRING, required=True, nargs=1)
+@click.option("--since", "-s", "since", help="Only use samples from this long ago (e.g. 30m, 1h, 7d)",
+              type=click.STRING, default=None)
+def stats_(server_id: str, since: Optional[str]):
+    import tabulate
+
+    from .metrics import parse_duration, read_summary
+
+    try:
+        since_ts = time.time() - parse_duration(since) if since else None
+        count, summary = read_summary(server_id.lower(), since_ts)
+    except (ValueError, FileNotFoundError) as e:
+        echo(f"mcsrv: {Fore.RED}{e}")
+        raise click.exceptions.Exit(code=1)
+
+    if not count:
+        echo(f"mcsrv: {Fore.YELLOW}no samples recorded in that period")
+        return
+
+    formats = {
+        "cpu": ("CPU", lambda v: f"{v:.1f}%"),
+        "rss": ("RAM", lambda v: f"{v / 1000000000:.2f}GB"),
+        "threads": ("Threads", lambda v: f"{v:.0f}"),
+        "fds": ("Open Files", lambda v: f"{v:.0f}"),
+        "players": ("Players", lambda v: f"{v:.1f}"),
+    }
+
+    rows = [[name, *map(fmt, summary[key])] for key, (name, fmt) in formats.items()]
+
+    echo(f"{count} samples")
+    echo(tabulate.tabulate(rows, ["", "Min", "Avg", "Max", "P95"], tablefmt="rounded_outline"))
 
 
 @main.group(help="Manage Java Versions", invoke_without_command=True)
@@ -207,14 +724,23 @@ def java(ctx: click.Context):
     if ctx.invoked_subcommand is not None:
         return
 
+    handled, installations = daemon_call("java")
+
+    if not handled:
+        from .javaexecutable import JavaExecutable
+
+        installations = [(j.version, j.path) for j in JavaExecutable.get_known_java_installations()]
+
     echo("Registered Java installations:")
-    for j in JavaExecutable.get_known_java_installations():
-        echo(f"  {j.version} ({j.path})")
+    for version, path in installations:
+        echo(f"  {version} ({path})")
 
 
 @java.command(name="add", help="Register a Java Version")
 @click.argument("path", type=click.STRING, required=True, nargs=1)
 def add_java_version(path: str):
+    from .javaexecutable import JavaExecutable
+
     try:
         new_java = JavaExecutable(path).register()
     except ValueError:
@@ -226,7 +752,9 @@ def add_java_version(path: str):
 @java.command(name="set", help="Set the Java Version of the Server")
 @click.argument("java_version_path", type=click.STRING, required=False, nargs=1)
 @pass_server
-def set_java_version(server: Server, java_version_path: str):
+def set_java_version(server: "Server", java_version_path: str):
+    from .javaexecutable import JavaExecutable, prompt_java_version
+
     if java_version_path is None:
         java_version_path = prompt_java_version()
 
@@ -240,39 +768,147 @@ def set_java_version(server: Server, java_version_path: str):
     server.print_restart_note()
 
 
-@main.command(name="properties", help="Read and change server properties")
-@click.argument("key", type=click.STRING, required=True, nargs=1)
-@click.argument("value", type=click.STRING, required=False, nargs=1)
+def get_property_targets(ctx: click.Context, all_: bool, ids: Optional[str]) -> dict[str, pathlib.Path]:
+    """
+    :return: dict of server ids and the paths of their server.properties, without loading the servers
+    """
+    if not all_ and not ids:
+        server = get_server(ctx, read_only=True)
+        return {server.id: server.path.joinpath("server.properties")}
+
+    if all_:
+        return {k: pathlib.Path(v["path"], "server.properties") for k, v in ServerRegistry.entries().items()}
+
+    out = {}
+
+    for server_id in filter(None, (i.strip().lower() for i in ids.split(","))):
+        path = ServerRegistry.get_path(server_id)
+
+        if path is None:
+            echo(f"mcsrv: {Fore.RED}Unknown server: {server_id}")
+            raise click.exceptions.Exit(code=1)
+
+        out[server_id] = pathlib.Path(path, "server.properties")
+
+    return out
+
+
+@main.command(name="properties", help="Read and change server properties. Usage: KEY [VALUE] or KEY=VALUE...")
+@click.argument("args", type=click.STRING, required=True, nargs=-1)
+@click.option("--all", "-a", "all_", help="Apply to all registered Servers", is_flag=True, default=False)
+@click.option("--ids", "-i", "ids", help="Comma separated ids of the Servers to apply to", type=click.STRING,
+              default=None)
 @click.option("--strip", "-f", "strip", help="Format output for easier interpreting by machines", is_flag=True,
               default=False)
-@pass_server
-def properties_cmd(server: Server, key: str, value: str, strip: bool):
+@click.pass_context
+def properties_cmd(ctx: click.Context, args: tuple[str], all_: bool, ids: Optional[str], strip: bool):
     # TODO: implement `strip`
+    from .properties import ServerProperties, rewrite_properties
+
+    if "=" in args[0]:
+        if not all("=" in a for a in args):
+            echo(f"mcsrv: {Fore.RED}Expected KEY=VALUE for every argument")
+            raise click.exceptions.Exit(code=1)
+
+        changes = dict(a.split("=", 1) for a in args)
+    elif len(args) == 2:
+        changes = {args[0]: args[1]}
+    elif len(args) == 1:
+        changes = None
+    else:
+        echo(f"mcsrv: {Fore.RED}Expected KEY [VALUE] or KEY=VALUE...")
+        raise click.exceptions.Exit(code=1)
+
+    targets = get_property_targets(ctx, all_, ids)
+
+    if changes is None:  # print value
+        key = args[0]
+        missing = False
+
+        for server_id, path in targets.items():
+            props = ServerProperties(path)
 
-    if not value:  # print value
-        if key not in server.properties:
-            server.print(f"not defined: {key}")
+            if key not in props:
+                echo(f"mcsrv: {server_id}: not defined: {key}")
+                missing = True
+                continue
+
+            echo(f"mcsrv: {server_id}: {key} is {Style.BRIGHT}{props.get_value(key)}{Style.RESET_ALL}")
+
+        if missing:
             raise click.exceptions.Exit(1)
+        return
 
-        server.print(f"{key} is {Style.BRIGHT}{server.properties.get_value(key)}{Style.RESET_ALL}")
+    if not all_ and not ids:  # single server, print what changed
+        server = get_server(ctx, read_only=True)
+        props = ServerProperties(server.path.joinpath("server.properties"))
+
+        if rewrite_properties(props.path, changes):
+            for key, value in changes.items():
+                prev_val = props.get_value(key) if key in props else None
+
+                if prev_val == value:
+                    continue
+
+                server.print(f"changed {key} from {Style.BRIGHT}{prev_val}{Style.RESET_ALL} "
+                             f"to {Style.BRIGHT}{value}{Style.RESET_ALL}")
+
+            server.print_restart_note()
+        else:
+            server.print("nothing changed")
         return
 
-    # set key to value
-    prev_val = server.properties.get_value(key)
-    server.properties.set_value(key, value, save=True)
-    server.print(
-        f"changed {key} from {Style.BRIGHT}{prev_val}{Style.RESET_ALL} to {Style.BRIGHT}{value}{Style.RESET_ALL}")
-    server.print_restart_note()
+    changed_ids = []
+
+    for server_id, path in targets.items():
+        if not path.parent.is_dir():
+            echo(f"mcsrv: {server_id}: {Fore.RED}directory doesn't exist: {path.parent}")
+            continue
+
+        if rewrite_properties(path, changes):
+            changed_ids.append(server_id)
+
+    summary = ", ".join(f"{Style.BRIGHT}{k}{Style.RESET_ALL}={v}" for k, v in changes.items())
+    echo(f"mcsrv: set {summary} on {len(changed_ids)} of {len(targets)} servers")
+
+    from .util import ScreenRegistry
+
+    for server_id in changed_ids:
+        if ScreenRegistry.get(f"mc-{server_id}") is not None:
+            echo(f"mcsrv: {server_id}: {Fore.YELLOW}note that you must restart the server for changes to take effect")
 
 
 @main.command(name="port", help="Set/get the server port")
 @click.argument("port", type=click.INT, required=False, nargs=1)
+@click.option("--auto", "auto", help="Use the lowest port in the range that no other Server uses", is_flag=True,
+              default=False)
+@click.option("--range", "port_range", help="Port range for --auto", type=click.STRING, default=None,
+              envvar="MCSRV_PORT_RANGE")
 @pass_server
-def port_(server: Server, port: Optional[int]):
+def port_(server: "Server", port: Optional[int], auto: bool, port_range: str):
+    from .ports import DEFAULT_PORT_RANGE, PortIndex, parse_port_range
+
+    index = PortIndex().refresh()
+
+    if auto:
+        try:
+            port_range = port_range or DEFAULT_PORT_RANGE
+            port = index.next_free(parse_port_range(port_range), exclude=server.id)
+        except ValueError as e:
+            server.print(f"{Fore.RED}{e}")
+            raise click.exceptions.Exit(code=1)
+
+        if port is None:
+            server.print(f"{Fore.RED}no free port in {port_range}")
+            raise click.exceptions.Exit(code=1)
+
     if not port:
         server.print(f"current port: {Style.BRIGHT}{server.properties.get_value('server-port')}{Style.RESET_ALL}")
         return
 
+    for key, other_port, owners in index.collisions(server.id, {"server-port": port}):
+        server.print(f"{Fore.YELLOW}port {other_port} is also used by {', '.join(owners)}")
+
     server.properties.set_value("server-port", port, save=True)
     server.print(f"server port is now {Style.BRIGHT}{port}{Style.RESET_ALL}")
     server.print_restart_note()
@@ -281,7 +917,9 @@ def port_(server: Server, port: Optional[int]):
 @main.command(name="commandblocks", help="Enable/disable command blocks")
 @click.argument("enable", type=click.BOOL, required=False, nargs=1)
 @pass_server
-def commandblocks_(server: Server, enable: Optional[bool]):
+def commandblocks_(server: "Server", enable: Optional[bool]):
+    from .util import format_enabled
+
     if enable is None:
         server.print(
             f"command blocks are currently {format_enabled(server.properties.get_value('enable-command-block') == 'true')}")
@@ -304,9 +942,16 @@ def start_html(port: int, debug: bool):
 @main.command(name="dir", help="Print the directory of the server")
 @click.argument("server_id", type=click.STRING, required=True, nargs=1)
 def get_server_dir(server_id: str):
-    server = Server.get_by_id(server_id)
+    handled, path = daemon_call("dir", server_id=server_id)
+
+    if not handled:
+        path = ServerRegistry.get_path(server_id)
+
+    if path is None:
+        echo(f"mcsrv: {Fore.RED}Unknown server: {server_id}", err=True)
+        raise click.exceptions.Exit(code=1)
 
-    echo(server.path)
+    echo(path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,48 @@
+import json
+import os
+import pathlib
+import socket
+from typing import Any
+
+SOCKET_PATH = pathlib.Path(os.environ.get("MCSRVD_SOCKET", "~/.mcsrvd.sock")).expanduser()
+
+
+class DaemonError(Exception):
+    pass
+
+
+class DaemonUnavailable(DaemonError):
+    pass
+
+
+def daemon_request(method: str, timeout: float = 10.0, **params) -> Any:
+    """
+    Calls a method of a running mcsrvd
+
+    :raises DaemonUnavailable: if there is no daemon listening
+    :raises DaemonError: if the daemon couldn't handle the request
+    :return: the result of the method
+    """
+    if not SOCKET_PATH.exists():
+        raise DaemonUnavailable("daemon is not running")
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(SOCKET_PATH))
+            sock.sendall(json.dumps({"method": method, "params": params}).encode() + b"\n")
+
+            with sock.makefile("rb") as f:
+                line = f.readline()
+    except OSError as e:
+        raise DaemonUnavailable(str(e))
+
+    try:
+        response = json.loads(line)
+    except ValueError:
+        raise DaemonError("invalid response")
+
+    if not response.get("ok"):
+        raise DaemonError(response.get("error", "unknown error"))
+
+    return response.get("result")
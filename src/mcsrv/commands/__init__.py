@@ -1,2 +1,3 @@
 from .create import create
 from .start import start, start_auto
+from .update import get_newest_major, update
@@ -1,8 +1,9 @@
 import os
+import pathlib
+from typing import Optional
 
-import dispenser
-from dispenser.impl import VERSION_PROVIDERS
-
+from ..artifacts import ArtifactCache, snapshot_dir
+from ..ports import DEFAULT_PORT_RANGE, PortIndex, parse_port_range
 from ..server import Server
 from ..util import is_valid_ram_argument
 from ..prompt import prompt_user, yesno, valid_yesno
@@ -11,10 +12,12 @@ from ..prompt import prompt_user, yesno, valid_yesno
 # TODO: prompt for autostart
 
 def setup_server_interactively(s: Server):
+    free_port = PortIndex().refresh().next_free(parse_port_range(DEFAULT_PORT_RANGE), exclude=s.id)
+
     settings = prompt_user({
         "port": {
             "prompt": "Port",
-            "default": "25565",
+            "default": str(free_port or 25565),
             "validate": str.isnumeric,
             "clean": str.strip
         },
@@ -77,13 +80,48 @@ def setup_server_interactively(s: Server):
     s.ram = settings["ram"]
 
 
-def create(name: str, version: tuple[str], interactive: bool, newest: bool):
-    dispenser.init()
-
+def create(name: str, version: tuple[str], interactive: bool, newest: bool, dedupe: bool = False):
     if os.path.exists(name) and not (os.path.isdir(name) and not os.listdir(name)):
         print("mcsrv: directory/file already exists")
         return
 
+    cache = ArtifactCache()
+
+    if len(version) == 3 and cache.restore(version, pathlib.Path(name)):
+        print(f"mcsrv: creating {' '.join(version)} server from the cache")
+    else:
+        version = dispense(name, version, newest, cache)
+
+        if version is None:
+            return
+
+    s = Server(name).register()
+
+    s.version = version
+
+    if dedupe:
+        from ..store import SharedStore
+
+        result = SharedStore().dedupe(s.path)
+        s.print(f"{result.linked} of {result.files} files shared, saved {result.saved / 1000000:.1f}MB")
+
+    if interactive:
+        setup_server_interactively(s)
+
+    s.print("server created")
+
+
+def dispense(name: str, version: tuple[str], newest: bool, cache: ArtifactCache) -> Optional[tuple[str, str, str]]:
+    """
+    Downloads a server into the directory `name` and adds its files to the artifact cache
+
+    :return: the dispensed version, None if only the available versions were printed
+    """
+    import dispenser
+    from dispenser.impl import VERSION_PROVIDERS
+
+    dispenser.init()
+
     if not os.path.isdir(name):
         os.mkdir(name)
 
@@ -104,15 +142,15 @@ def create(name: str, version: tuple[str], interactive: bool, newest: bool):
 
     if avail is not None:
         print(f"mcsrv: available versions: {' '.join(avail)}")
-        return
+        return None
 
     print(f"mcsrv: creating {' '.join(version)} server")
-    dispenser.dispense(version[0], version[1], version[2], name)
-    s = Server(name).register()
 
-    s.version = version
+    if cache.restore(version, pathlib.Path(name)):
+        return version
 
-    if interactive:
-        setup_server_interactively(s)
+    before = snapshot_dir(pathlib.Path(name))
+    dispenser.dispense(version[0], version[1], version[2], name)
+    cache.put(version, pathlib.Path(name), before)
 
-    s.print("server created")
+    return version
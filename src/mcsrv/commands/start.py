@@ -1,14 +1,98 @@
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+
+import click
+from click import echo
 from colorama import Fore, Back
 
+from ..memory import DEFAULT_HEADROOM, MemoryScheduler, format_bytes
+from ..ports import PortIndex
 from ..server import Server
+from ..util import ScreenRegistry, check_ram_argument
+
+JVM_WAIT_TIMEOUT = 10.0
+JVM_POLL_INTERVAL = 0.2
+
+
+def get_running_ids() -> set[str]:
+    return {name[3:] for name in ScreenRegistry.screens() if name.startswith("mc-")}
+
+
+def find_port_collisions(server: Server, index: PortIndex, active: set[str]) -> list[str]:
+    """
+    :param active: ids of the servers that are running or about to be started
+    :return: descriptions of the ports of the server that an active server uses too
+    """
+    out = []
+
+    for key, port, owners in index.collisions(server.id):
+        owners = [o for o in owners if o in active]
+
+        if owners:
+            out.append(f"{key} {port} is used by {', '.join(owners)}")
+
+    return out
+
+
+def wait_for_java(server: Server, timeout: float = JVM_WAIT_TIMEOUT) -> bool:
+    """
+    Waits until the java process of a server that was just started is visible, from then on `MemoryScheduler.committed`
+    accounts for its memory and the reservation of the start can be released
+
+    :return: whether the java process showed up within `timeout` seconds
+    """
+    deadline = time.monotonic() + timeout
+
+    while server.java_process is None:
+        if time.monotonic() >= deadline:
+            return False
 
+        time.sleep(JVM_POLL_INTERVAL)
+        ScreenRegistry.reload_if_changed()
 
-def start(server: Server, ram_: str, open_console: bool):
+    return True
+
+
+def start_server(server: Server, ram: str) -> None:
+    import asyncio
+
+    from ..aio import AsyncServer
+
+    asyncio.run(AsyncServer(server).start(ram))
+
+
+def start(server: Server, ram_: str, open_console: bool, headroom: str = DEFAULT_HEADROOM, force: bool = False):
     if server.running:
         server.print(f"{Fore.YELLOW}Server is already running")
         return
 
-    server.start(ram=ram_)
+    ram = check_ram_argument(ram_) if ram_ else server.ram
+    headroom = check_ram_argument(headroom)
+
+    if not force:
+        collisions = find_port_collisions(server, PortIndex().refresh(), get_running_ids())
+
+        if collisions:
+            server.print(f"{Fore.RED}Port collision: {'; '.join(collisions)}. Use --force to start anyway")
+            raise click.exceptions.Exit(code=1)
+
+    if force:
+        start_server(server, ram)
+    else:
+        scheduler = MemoryScheduler(Server.get_registered_servers(read_only=True), headroom)
+
+        with scheduler.reserve(ram) as ok:
+            if not ok:
+                server.print(f"{Fore.RED}Not enough memory to start with {ram}B RAM "
+                             f"({format_bytes(max(0, scheduler.free()))} available). Use --force to start anyway")
+                raise click.exceptions.Exit(code=1)
+
+            start_server(server, ram)
+            # `screen -dm` returns before the jvm is up, until then the reservation is all that accounts for it
+            wait_for_java(server)
 
     if not server.running:
         server.print(f"{Fore.RED}An unknown error occurred while starting the Server")
@@ -24,7 +108,101 @@ def start(server: Server, ram_: str, open_console: bool):
     server.open_console()
 
 
-def start_auto():
-    for server in Server.get_registered_servers():
-        if server.autostarts and not server.running:
+class StartSlots:
+    """
+    Hands out start slots to the workers of `start auto` so that two starts are at least `stagger` seconds apart
+    """
+
+    def __init__(self, stagger: float):
+        self.stagger: float = stagger
+        self._next: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def wait(self, delay: float = 0.0) -> None:
+        # sleep for the per-server delay without holding the lock, so other workers can take their slots meanwhile
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            slot = max(self._next, time.monotonic())
+            self._next = slot + self.stagger
+
+        time.sleep(max(0.0, slot - time.monotonic()))
+
+
+def _start_timed(server: Server, slots: StartSlots, scheduler: Optional[MemoryScheduler],
+                 memory_timeout: float) -> tuple[bool, float, Optional[str]]:
+    begin = time.monotonic()
+    reservation = scheduler.reserve(server.ram, memory_timeout) if scheduler else contextlib.nullcontext(True)
+
+    with reservation as ok:
+        if not ok:
+            return False, time.monotonic() - begin, "not enough memory"
+
+        slots.wait(server.autostart_delay)
+        begin = time.monotonic()
+
+        try:
             server.start()
+
+            if scheduler:
+                wait_for_java(server)
+        except click.exceptions.Exit:
+            return False, time.monotonic() - begin, "start failed"
+        except Exception as e:
+            return False, time.monotonic() - begin, str(e)
+
+    if not server.running:
+        return False, time.monotonic() - begin, "screen session not found"
+
+    return True, time.monotonic() - begin, None
+
+
+def start_auto(workers: int = 4, stagger: float = 0.0, headroom: Optional[str] = DEFAULT_HEADROOM,
+               memory_timeout: float = 300.0, check_ports: bool = True):
+    registered = Server.get_registered_servers()
+    servers = [s for s in registered if s.autostarts and not s.running]
+
+    if not servers:
+        echo("mcsrv: no servers to autostart")
+        return
+
+    # higher priority first, the pool picks up the servers in submission order
+    servers.sort(key=lambda s: s.autostart_priority, reverse=True)
+    slots = StartSlots(stagger)
+    scheduler = MemoryScheduler(registered, check_ram_argument(headroom)) if headroom is not None else None
+    results = {}
+    to_start = servers
+
+    if check_ports:
+        # a server whose ports are taken by a running server or one with a higher priority is skipped
+        index = PortIndex().refresh()
+        active = get_running_ids()
+        to_start = []
+
+        for server in servers:
+            collisions = find_port_collisions(server, index, active)
+
+            if collisions:
+                results[server.id] = (False, 0.0, f"port collision: {'; '.join(collisions)}")
+                continue
+
+            active.add(server.id)
+            to_start.append(server)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_start_timed, server, slots, scheduler, memory_timeout): server for server in to_start}
+
+        for future in as_completed(futures):
+            results[futures[future].id] = future.result()
+
+    import tabulate
+
+    rows = []
+
+    for server in servers:
+        ok, duration, error = results[server.id]
+        status = f"{Fore.GREEN}started{Fore.RESET}" if ok else f"{Fore.RED}failed{Fore.RESET}: {error}"
+        rows.append([server.id, server.autostart_priority, status, f"{duration:.2f}s"])
+
+    echo(tabulate.tabulate(rows, ["ID", "Priority", "Result", "Time"], tablefmt="rounded_outline"))
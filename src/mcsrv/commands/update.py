@@ -0,0 +1,76 @@
+import pathlib
+import tempfile
+from typing import Optional
+
+from ..artifacts import ArtifactCache, update_from_cache
+from ..server import Server
+
+
+def fetch_version(cache: ArtifactCache, version: tuple[str, str, str]) -> bool:
+    """
+    Makes sure a version is in the artifact cache, dispensing it into an empty staging directory if it isn't
+
+    :return: whether the version is cached
+    """
+    if version in cache:
+        return True
+
+    import dispenser
+
+    dispenser.init()
+    cache.root.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix=".staging-", dir=cache.root) as staging:
+        dispenser.dispense(version[0], version[1], version[2], staging)
+        return cache.put(version, pathlib.Path(staging), {}) is not None
+
+
+def get_newest_major(software: str) -> str:
+    import dispenser
+    from dispenser.impl import VERSION_PROVIDERS
+
+    dispenser.init()
+    return VERSION_PROVIDERS[software].get_newest_major()
+
+
+def update(server: Server, new_major: Optional[str], new_minor: Optional[str]) -> None:
+    """
+    Updates a server to another version, from the artifact cache if possible
+
+    Versions that aren't given are resolved to the newest one. If the installed version isn't cached, it isn't known
+    which of the files in the server directory belong to it, so dispenser replaces them in place and the new version
+    is fetched into the cache afterwards.
+
+    :param new_major: the major version to update to, None to keep the current one when `new_minor` is given
+    :param new_minor: the minor version to update to
+    """
+    cache = ArtifactCache()
+    software, major, _ = server.version
+    new_major = new_major or major
+
+    if new_minor is None:
+        import dispenser
+        from dispenser.impl import VERSION_PROVIDERS
+
+        dispenser.init()
+        new_minor = VERSION_PROVIDERS[software].get_newest_minor(new_major)
+
+    new_version = (software, new_major, new_minor)
+
+    if server.version in cache and fetch_version(cache, new_version) \
+            and update_from_cache(cache, server.version, new_version, server.path):
+        server.version = new_version
+        server.print(f"updated to {' '.join(new_version)} from the cache")
+        return
+
+    import dispenser
+
+    dispenser.init()
+
+    if new_major != major:
+        server.version = dispenser.update_major(software, server.path, new_major)
+    else:
+        server.version = dispenser.update_minor(software, server.path, major, new_minor)
+
+    fetch_version(cache, server.version)
+    server.print(f"updated to {' '.join(server.version)}")
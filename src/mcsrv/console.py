@@ -0,0 +1,113 @@
+import os
+import pathlib
+import re
+import threading
+import time
+from typing import Optional, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .server import Server
+
+
+class ResponseMatcher:
+    """
+    Collects the output of a console request and decides when it is complete: once a line matches `until`, or if it
+    isn't given, once the log has been quiet for `quiet_period` seconds after the first response line
+    """
+
+    def __init__(self, until: Union[str, re.Pattern, None], quiet_period: float):
+        self.until: Optional[re.Pattern] = re.compile(until) if isinstance(until, str) else until
+        self.quiet_period: float = quiet_period
+        self.lines: list[str] = []
+        self._last_output: Optional[float] = None
+
+    def feed(self, lines: list[str]) -> bool:
+        """
+        :param lines: the lines read since the last call, may be empty
+        :return: whether the response is complete
+        """
+        if lines:
+            self.lines.extend(lines)
+            self._last_output = time.monotonic()
+            return bool(self.until) and any(self.until.search(line) for line in lines)
+
+        return not self.until and self._last_output is not None \
+            and time.monotonic() - self._last_output >= self.quiet_period
+
+
+class ConsoleChannel:
+    """
+    Sends commands to the console of a server and collects their output from logs/latest.log
+
+    The size of the log is recorded before sending, everything logged after that is the response. Requests to the same
+    server are serialized so their outputs can't interleave, requests to different servers run independently.
+    """
+    POLL_INTERVAL = .02
+    QUIET_PERIOD = .25
+
+    _locks: dict[str, threading.Lock] = {}
+    _locks_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, server: "Server"):
+        self.server: "Server" = server
+        self.log_path: pathlib.Path = server.path.joinpath("logs", "latest.log")
+
+    @property
+    def lock(self) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(str(self.server.path), threading.Lock())
+
+    def log_size(self) -> int:
+        try:
+            return os.stat(self.log_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def read_lines(self, offset: int) -> tuple[list[str], int]:
+        try:
+            with self.log_path.open("rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+
+        end = data.rfind(b"\n") + 1
+        return data[:end].decode("utf-8", "replace").splitlines(), offset + end
+
+    def send(self, *commands: str) -> None:
+        """
+        Sends one or more commands in a single round trip without waiting for output
+        """
+        screen = self.server.screen_handle
+
+        if screen is None:
+            raise RuntimeError(f"server {self.server.id!r} is not running")
+
+        screen.send_commands(commands)
+
+    def request(self, *commands: str, timeout: float = 2.0, until: Union[str, re.Pattern, None] = None) -> list[str]:
+        """
+        Sends the commands and waits for their output
+
+        :param commands: the commands to send in one batch
+        :param timeout: maximum seconds to wait for output
+        :param until: stop reading once a line matches this pattern. If not given, reading stops after the log has
+            been quiet for a moment after the first response line.
+        :return: the lines logged after the commands have been sent
+        """
+        matcher = ResponseMatcher(until, self.QUIET_PERIOD)
+
+        with self.lock:
+            offset = self.log_size()
+            self.send(*commands)
+            deadline = time.monotonic() + timeout
+
+            while time.monotonic() < deadline:
+                lines, offset = self.read_lines(offset)
+
+                if matcher.feed(lines):
+                    break
+
+                time.sleep(self.POLL_INTERVAL)
+
+            return matcher.lines
@@ -0,0 +1,192 @@
+import json
+import os
+import socketserver
+import threading
+from typing import Any, Optional
+
+import click
+
+from .client import SOCKET_PATH, DaemonUnavailable, daemon_request
+from .javaexecutable import JavaExecutable
+from .metrics import MetricsCollector
+from .registry import ServerRegistry
+from .server import Server, ALL_LIST_PROPERTIES
+from .stats import SAMPLE_INTERVAL, StatsSampler
+from .util import ScreenRegistry
+
+
+class Service:
+    """
+    The state mcsrvd keeps warm between requests: loaded servers, the registry, the screen index, the java version
+    cache and a background stats sampler
+    """
+
+    def __init__(self, stats_interval: float = SAMPLE_INTERVAL):
+        self._servers: dict[str, tuple[tuple, Server]] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.sampler: StatsSampler = StatsSampler(self.running_servers, stats_interval)
+
+    @staticmethod
+    def _mtimes(path: str) -> tuple:
+        out = []
+
+        for name in (".mcsrvmeta", "server.properties"):
+            try:
+                out.append(os.stat(os.path.join(path, name)).st_mtime_ns)
+            except OSError:
+                out.append(None)
+
+        return tuple(out)
+
+    def servers(self) -> list[Server]:
+        with self._lock:
+            ServerRegistry.reload_if_changed()
+            paths = ServerRegistry.paths()
+            out = []
+
+            for path in paths:
+                mtimes = self._mtimes(path)
+                cached = self._servers.get(path)
+
+                if cached and cached[0] == mtimes:
+                    out.append(cached[1])
+                    continue
+
+                try:
+                    server = Server(path, read_only=True)
+                except FileNotFoundError:
+                    continue
+
+                self._servers[path] = mtimes, server
+                out.append(server)
+
+            for path in set(self._servers) - set(paths):
+                del self._servers[path]
+
+            return out
+
+    def running_servers(self) -> list[Server]:
+        ScreenRegistry.reload_if_changed()
+        return [s for s in self.servers() if s.running]
+
+    def get_server(self, server_id: str) -> Server:
+        for server in self.servers():
+            if server.id == server_id.lower():
+                return server
+
+        raise KeyError(f"unknown server: {server_id}")
+
+    def call(self, method: str, params: dict) -> Any:
+        func = getattr(self, f"rpc_{method}", None)
+
+        if func is None:
+            raise KeyError(f"unknown method: {method}")
+
+        ScreenRegistry.reload_if_changed()
+        return func(**params)
+
+    def rpc_ping(self) -> str:
+        return "pong"
+
+    def rpc_dir(self, server_id: str) -> Optional[str]:
+        ServerRegistry.reload_if_changed()
+        return ServerRegistry.get_path(server_id)
+
+    def rpc_list(self, props: str = ALL_LIST_PROPERTIES, plain: bool = False,
+                 only_running: bool = False) -> list[list[str]]:
+        servers = [s for s in self.servers() if not only_running or s.running]
+        return [[str(v) for v in s.get_list_data(props, plain, self.sampler.get(s.id))] for s in servers]
+
+    def rpc_records(self, props: str = ALL_LIST_PROPERTIES, only_running: bool = False) -> list[dict]:
+        servers = [s for s in self.servers() if not only_running or s.running]
+        return [s.get_list_record(props, self.sampler.get(s.id)) for s in servers]
+
+    def rpc_servers(self) -> list[dict]:
+        return [self.describe(s) for s in self.servers()]
+
+    def rpc_server(self, server_id: str) -> dict:
+        return self.describe(self.get_server(server_id))
+
+    def rpc_java(self) -> list[list[str]]:
+        return [[j.version, j.path] for j in JavaExecutable.get_known_java_installations()]
+
+    def describe(self, server: Server) -> dict:
+        cpu, ram = self.sampler.get(server.id)
+
+        return {
+            "id": server.id,
+            "path": str(server.path),
+            "running": server.running,
+            "autostart": server.autostarts,
+            "launch_method": server.launch_method[0],
+            "allocated_ram": server.ram,
+            "port": server.properties.get_value("server-port") if "server-port" in server.properties else None,
+            "cpu": cpu,
+            "ram": ram,
+        }
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                result = self.server.service.call(request["method"], request.get("params", {}))
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, service: Service):
+        self.service: Service = service
+        super().__init__(str(SOCKET_PATH), RequestHandler)
+
+
+@click.command(help="Run the mcsrv daemon")
+@click.option("--interval", "-i", "interval", help="Seconds between two stats samples", type=click.FLOAT,
+              default=SAMPLE_INTERVAL)
+@click.option("--monitor", "-m", "monitor_interval", help="Also record metrics every n seconds (see mcsrv monitor)",
+              type=click.FLOAT, default=None)
+def main(interval: float, monitor_interval: Optional[float]):
+    try:
+        daemon_request("ping", timeout=1)
+        click.echo(f"mcsrvd: already running at {SOCKET_PATH}")
+        raise click.exceptions.Exit(code=1)
+    except DaemonUnavailable:
+        pass
+
+    SOCKET_PATH.unlink(missing_ok=True)
+
+    service = Service(interval)
+    service.sampler.start()
+    collector = MetricsCollector(monitor_interval).start() if monitor_interval else None
+
+    old_umask = os.umask(0o177)
+
+    try:
+        server = DaemonServer(service)
+    finally:
+        os.umask(old_umask)
+
+    click.echo(f"mcsrvd: listening on {SOCKET_PATH}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        SOCKET_PATH.unlink(missing_ok=True)
+        service.sampler.stop()
+
+        if collector:
+            collector.stop()
+
+
+if __name__ == '__main__':
+    main()
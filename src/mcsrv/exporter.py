@@ -0,0 +1,108 @@
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
+
+from .memory import get_allocated_ram, ram_to_bytes
+
+if TYPE_CHECKING:
+    from .daemon import Service
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = {
+    "mcsrv_server_up": "Whether the server is running",
+    "mcsrv_server_cpu_percent": "CPU usage of the java process in percent",
+    "mcsrv_server_rss_bytes": "Resident memory of the java process",
+    "mcsrv_server_allocated_ram_bytes": "Maximum heap size (-Xmx) of the server",
+    "mcsrv_server_players": "Number of online players",
+    "mcsrv_server_uptime_seconds": "Seconds since the java process was started",
+    "mcsrv_server_java_info": "Java version the server runs with",
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def render_metrics(service: "Service") -> str:
+    """
+    Renders the gauges of all servers in the Prometheus text format
+
+    CPU and RSS come from the background sampler of the service, so this never waits for a fresh cpu measurement.
+    """
+    values: dict[str, list[str]] = {name: [] for name in METRICS}
+    now = time.time()
+
+    for server in service.servers():
+        labels = _labels(server=server.id)
+        running = server.running
+
+        values["mcsrv_server_up"].append(f"mcsrv_server_up{labels} {int(running)}")
+
+        try:
+            allocated = (get_allocated_ram(server) if running else None) or ram_to_bytes(server.ram)
+            values["mcsrv_server_allocated_ram_bytes"].append(f"mcsrv_server_allocated_ram_bytes{labels} {allocated}")
+        except ValueError:
+            pass
+
+        try:
+            version = server.java_executable.version
+            values["mcsrv_server_java_info"].append(
+                f"mcsrv_server_java_info{_labels(server=server.id, version=version)} 1")
+        except Exception:
+            pass
+
+        if not running:
+            continue
+
+        if sample := service.sampler.processes.get(server.id):
+            values["mcsrv_server_cpu_percent"].append(f"mcsrv_server_cpu_percent{labels} {sample.cpu}")
+            values["mcsrv_server_rss_bytes"].append(f"mcsrv_server_rss_bytes{labels} {sample.rss}")
+
+        values["mcsrv_server_players"].append(f"mcsrv_server_players{labels} {server.player_count}")
+
+        if proc := server.java_process:
+            try:
+                values["mcsrv_server_uptime_seconds"].append(
+                    f"mcsrv_server_uptime_seconds{labels} {now - proc.create_time():.0f}")
+            except Exception:
+                pass
+
+    out = []
+
+    for name, help_ in METRICS.items():
+        out.append(f"# HELP {name} {help_}")
+        out.append(f"# TYPE {name} gauge")
+        out.extend(values[name])
+
+    return "\n".join(out) + "\n"
+
+
+class ExporterHandler(BaseHTTPRequestHandler):
+    service: "Service" = None
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render_metrics(self.service).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+def serve(service: "Service", host: str, port: int) -> None:
+    handler = type("Handler", (ExporterHandler,), {"service": service})
+
+    with ThreadingHTTPServer((host, port), handler) as server:
+        server.serve_forever()
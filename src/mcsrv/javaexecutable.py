@@ -1,19 +1,24 @@
+import json
 import os.path
 import pathlib
 import shlex
 import shutil
 import subprocess
-from typing import Union
+import threading
+from functools import cached_property
+from typing import Optional, Union
 
 import click
-import inquirer
 from click import echo
 from colorama import Fore, Back
 
 RC_PATH = pathlib.Path("~/.javaversions").expanduser()
+VERSION_CACHE_PATH = pathlib.Path("~/.javaversions.cache").expanduser()
 
 
 def prompt_java_version():
+    import inquirer
+
     installations = JavaExecutable.get_known_java_installations()
 
     if len(installations) == 0:
@@ -34,6 +39,72 @@ def prompt_java_version():
     return answer["java_ver"]
 
 
+class JavaVersionCache:
+    """
+    On-disk cache of `java --version` outputs, keyed by the resolved binary path
+
+    An entry is only valid as long as the stat signature (mtime, inode, size) of the binary is unchanged, so the JVM is
+    only probed again when the installation is replaced or updated.
+    """
+    _entries: Optional[dict[str, dict]] = None
+
+    @staticmethod
+    def _stat_signature(path: str) -> list[int]:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_ino, st.st_size]
+
+    @classmethod
+    def _read(cls) -> dict[str, dict]:
+        try:
+            with VERSION_CACHE_PATH.open("r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    @classmethod
+    def get(cls, path: str) -> Optional[str]:
+        if cls._entries is None:
+            cls._entries = cls._read()
+
+        real_path = os.path.realpath(path)
+        entry = cls._entries.get(real_path)
+
+        if not entry:
+            return None
+
+        try:
+            if entry.get("stat") != cls._stat_signature(real_path):
+                return None
+        except OSError:
+            return None
+
+        return entry.get("version")
+
+    @classmethod
+    def put(cls, path: str, version: str) -> None:
+        real_path = os.path.realpath(path)
+
+        try:
+            signature = cls._stat_signature(real_path)
+        except OSError:
+            return
+
+        # merge with entries written by other processes in the meantime
+        cls._entries = cls._read()
+        cls._entries[real_path] = {"stat": signature, "version": version}
+
+        tmp = VERSION_CACHE_PATH.with_name(f"{VERSION_CACHE_PATH.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        try:
+            with tmp.open("w") as f:
+                json.dump(cls._entries, f)
+            os.replace(tmp, VERSION_CACHE_PATH)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+
 class JavaExecutable:
     @classmethod
     def get_known_java_installations(cls, return_paths: bool = False) -> list[Union["JavaExecutable", str]]:
@@ -56,17 +127,29 @@ class JavaExecutable:
         return JavaExecutable(installs[0])
 
     def __init__(self, path: str):
-        self.path: str = path.strip()
-        self.version: str = self.get_version()
+        path = path.strip()
+        exe = shutil.which(path)
+
+        if not exe:
+            echo(f"{Fore.RED}File {path!r} is not a valid java installation")
+            raise ValueError(f"file {path!r} is not a valid java installation")
+
+        self.path: str = exe
+
+    @cached_property
+    def version(self) -> str:
+        return self.get_version()
 
     def get_version(self) -> str:
-        path = shutil.which(self.path)
-        if not path:
-            echo(f"{Fore.RED}File {self.path!r} is not a valid java installation")
-            raise ValueError(f"file {self.path!r} is not a valid java installation")
+        version = JavaVersionCache.get(self.path)
+
+        if version is None:
+            version = self._probe_version()
+            JavaVersionCache.put(self.path, version)
 
-        self.path = path
+        return version
 
+    def _probe_version(self) -> str:
         version = subprocess.getoutput(shlex.join([self.path, "--version"])).split("\n")[0]
 
         if not version.startswith("Unrecognized option: --version"):
@@ -2,7 +2,6 @@ import pathlib
 from typing import Optional
 
 import click
-import inquirer
 from colorama import Fore
 
 from .launch import LaunchMethod
@@ -13,6 +12,8 @@ class JarLaunchMethod(LaunchMethod):
 
     @classmethod
     def could_satisfy(cls, path: pathlib.Path) -> Optional[str]:
+        import inquirer
+
         jars = list(path.glob("*.jar"))
 
         if not jars:
@@ -0,0 +1,172 @@
+import gzip
+import json
+import lzma
+import os
+import pathlib
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+
+ARCHIVE_DIR = "archive"
+LOG_NAME = re.compile(r"^(\d{4}-\d{2})-(\d{2})-(\d+)\.log\.gz$")
+# preset 6 needs about 94 MiB per compressor instead of 674 MiB for preset 9, the memory belongs to the servers
+XZ_PRESET = 6
+DEFAULT_WORKERS = 4
+
+
+class CompactResult(NamedTuple):
+    logs_dir: str
+    month: str
+    count: int
+    before: int
+    after: int
+
+
+def _sort_key(name: str) -> tuple[str, int]:
+    match = LOG_NAME.match(name)
+    return f"{match.group(1)}-{match.group(2)}", int(match.group(3))
+
+
+def _archive_paths(logs_dir: pathlib.Path, month: str) -> tuple[pathlib.Path, pathlib.Path]:
+    archive_dir = logs_dir.joinpath(ARCHIVE_DIR)
+    return archive_dir.joinpath(f"{month}.log.xz"), archive_dir.joinpath(f"{month}.json")
+
+
+def _load_index(path: pathlib.Path) -> dict[str, list[int]]:
+    try:
+        with path.open("r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return data if isinstance(data, dict) else {}
+
+
+def find_old_logs(logs_dir: pathlib.Path, before_month: str) -> dict[str, list[str]]:
+    """
+    :param before_month: logs of this month (YYYY-MM) and later are left alone, as the server may still be writing them
+    :return: dict of months and the names of their gzipped logs
+    """
+    out: dict[str, list[str]] = {}
+
+    try:
+        names = os.listdir(logs_dir)
+    except FileNotFoundError:
+        return out
+
+    for name in names:
+        match = LOG_NAME.match(name)
+
+        if match and match.group(1) < before_month:
+            out.setdefault(match.group(1), []).append(name)
+
+    for month_logs in out.values():
+        month_logs.sort(key=_sort_key)
+
+    return out
+
+
+def compact_month(logs_dir: str, month: str, names: list[str]) -> CompactResult:
+    """
+    Appends gzipped logs to the xz archive of their month and deletes them
+
+    Every log becomes its own xz stream, and the offset and length of the stream are stored in the index of the month,
+    so a single log can be decompressed without reading the rest of the archive. A concatenation of xz streams is
+    still a valid xz file, so the archive can also be read with `xzcat`.
+    """
+    logs_path = pathlib.Path(logs_dir)
+    archive, index_path = _archive_paths(logs_path, month)
+    archive.parent.mkdir(exist_ok=True)
+    index = _load_index(index_path)
+    new = [n for n in names if n not in index]
+    before = after = 0
+
+    if new:
+        tmp = archive.with_name(f"{archive.name}.{os.getpid()}.tmp")
+
+        if archive.exists():
+            shutil.copyfile(archive, tmp)
+
+        with tmp.open("ab") as f:
+            offset = f.tell()
+
+            for name in new:
+                source = logs_path.joinpath(name)
+                before += source.stat().st_size
+
+                with gzip.open(source, "rb") as log:
+                    data = log.read()
+
+                compressed = lzma.compress(data, preset=XZ_PRESET)
+                f.write(compressed)
+                index[name] = [offset, len(compressed), len(data)]
+                offset += len(compressed)
+                after += len(compressed)
+
+        os.replace(tmp, archive)
+
+        tmp = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+
+        with tmp.open("w") as f:
+            json.dump(index, f, indent=2)
+
+        os.replace(tmp, index_path)
+
+    # logs that were archived by an interrupted run are only deleted here
+    for name in names:
+        logs_path.joinpath(name).unlink(missing_ok=True)
+
+    return CompactResult(logs_dir, month, len(new), before, after)
+
+
+def compact_logs(server_paths: list[str], workers: Optional[int] = None) -> list[CompactResult]:
+    """
+    Compacts the logs of all past months of multiple servers, one month per worker process
+
+    :param server_paths: the directories of the servers
+    :param workers: number of worker processes, defaults to DEFAULT_WORKERS or the cpu count if it is lower
+    """
+    current_month = time.strftime("%Y-%m")
+    jobs = []
+
+    for path in server_paths:
+        logs_dir = pathlib.Path(path).joinpath("logs")
+
+        for month, names in find_old_logs(logs_dir, current_month).items():
+            jobs.append((str(logs_dir), month, names))
+
+    if not jobs:
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers or min(DEFAULT_WORKERS, os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(compact_month, *job) for job in jobs]
+        return [f.result() for f in futures]
+
+
+def read_day(logs_dir: pathlib.Path, date: str) -> Iterator[tuple[str, bytes]]:
+    """
+    Reads all logs of a day (YYYY-MM-DD), from the month archive or the gzipped logs that haven't been archived yet
+
+    :return: iterator of log names and their content, in the order they were written
+    """
+    archive, index_path = _archive_paths(logs_dir, date[:7])
+    index = {k: v for k, v in _load_index(index_path).items() if k.startswith(f"{date}-")}
+    names = set(index)
+
+    try:
+        names.update(n for n in os.listdir(logs_dir) if n.startswith(f"{date}-") and LOG_NAME.match(n))
+    except FileNotFoundError:
+        pass
+
+    for name in sorted(names, key=_sort_key):
+        if name in index:
+            offset, length, _ = index[name]
+
+            with archive.open("rb") as f:
+                f.seek(offset)
+                yield name, lzma.decompress(f.read(length))
+        else:
+            with gzip.open(logs_dir.joinpath(name), "rb") as f:
+                yield name, f.read()
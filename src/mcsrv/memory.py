@@ -0,0 +1,131 @@
+import contextlib
+import re
+import threading
+import time
+from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+
+import click
+
+from .util import ScreenRegistry, check_ram_argument
+
+if TYPE_CHECKING:
+    from .server import Server
+
+DEFAULT_HEADROOM = "1G"
+RAM_UNITS = {"M": 1024 ** 2, "G": 1024 ** 3}
+XMX_ARG = re.compile(r"^-Xmx(.+)$")
+
+
+def ram_to_bytes(value: str) -> int:
+    try:
+        value = check_ram_argument(value, echo_=False)
+    except click.exceptions.Exit:
+        raise ValueError(f"invalid RAM value: {value!r}")
+
+    return int(value[:-1]) * RAM_UNITS[value[-1].upper()]
+
+
+def format_bytes(value: int) -> str:
+    return f"{value / RAM_UNITS['G']:.1f}G"
+
+
+def get_allocated_ram(server: "Server") -> Optional[int]:
+    """
+    :return: the -Xmx the java process of the server has been started with in bytes, None if it isn't running
+    """
+    import psutil
+
+    proc = server.java_process
+
+    if proc is None:
+        return None
+
+    try:
+        cmdline = proc.cmdline()
+    except psutil.Error:
+        return None
+
+    for arg in cmdline:
+        if m := XMX_ARG.match(arg):
+            try:
+                return ram_to_bytes(m.group(1))
+            except ValueError:
+                break
+
+    return ram_to_bytes(server.ram)
+
+
+class MemoryScheduler:
+    """
+    Admission control for server starts
+
+    Memory that running servers may still claim is the part of their -Xmx that isn't resident yet. A start is only
+    admitted when the available memory minus that, minus the reservations of starts in progress and the headroom still
+    fits the -Xmx of the new server.
+    """
+    POLL_INTERVAL = 5.0
+
+    def __init__(self, servers: Iterable["Server"], headroom: str = DEFAULT_HEADROOM):
+        self.servers: list["Server"] = list(servers)
+        self.headroom: int = ram_to_bytes(headroom)
+        self._pending: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def committed(self) -> int:
+        import psutil
+
+        ScreenRegistry.reload_if_changed()
+        total = 0
+
+        for server in self.servers:
+            proc = server.java_process
+
+            if proc is None:
+                continue
+
+            try:
+                rss = proc.memory_info().rss
+            except psutil.Error:
+                continue
+
+            total += max(0, (get_allocated_ram(server) or 0) - rss)
+
+        return total
+
+    def free(self) -> int:
+        import psutil
+
+        return psutil.virtual_memory().available - self.committed() - self._pending - self.headroom
+
+    def try_reserve(self, ram: str) -> bool:
+        needed = ram_to_bytes(ram)
+
+        with self._lock:
+            if self.free() < needed:
+                return False
+
+            self._pending += needed
+            return True
+
+    def release(self, ram: str) -> None:
+        with self._lock:
+            self._pending -= ram_to_bytes(ram)
+
+    @contextlib.contextmanager
+    def reserve(self, ram: str, timeout: float = 0.0) -> Iterator[bool]:
+        """
+        Reserves memory for a server start, waiting up to `timeout` seconds for it to become available
+
+        The reservation is released when leaving the context, by then the started server is accounted for by
+        `committed`.
+        """
+        deadline = time.monotonic() + timeout
+
+        while not (ok := self.try_reserve(ram)) and time.monotonic() < deadline:
+            time.sleep(min(self.POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+        try:
+            yield ok
+        finally:
+            if ok:
+                self.release(ram)
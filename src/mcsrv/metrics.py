@@ -0,0 +1,183 @@
+import math
+import mmap
+import pathlib
+import re
+import struct
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional, TYPE_CHECKING
+
+from .stats import SAMPLE_INTERVAL, sample_processes
+
+if TYPE_CHECKING:
+    from .server import Server
+
+METRICS_DIR = pathlib.Path("~/.mcsrvmetrics").expanduser()
+DURATION_REGEX = re.compile(r"^([0-9]+(?:\.[0-9]+)?)([smhdw]?)$")
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class Sample(NamedTuple):
+    timestamp: float
+    cpu: float
+    rss: int
+    threads: int
+    fds: int
+    players: int
+
+
+class MetricsRing:
+    """
+    Fixed-size, memory-mapped ring buffer of samples of a single server
+
+    The file consists of a header holding the capacity and the number of samples ever written, followed by `capacity`
+    fixed-size records. Once full, the oldest record is overwritten, so the file never grows.
+    """
+    MAGIC = b"MCSM"
+    HEADER = struct.Struct("<4sIQ")
+    HEADER_SIZE = 32
+    RECORD = struct.Struct("<dfQIII")
+    DEFAULT_CAPACITY = 60480  # one week at the default interval of 10 seconds
+
+    @classmethod
+    def path_for(cls, server_id: str) -> pathlib.Path:
+        return METRICS_DIR.joinpath(f"{server_id}.ring")
+
+    def __init__(self, path: pathlib.Path, capacity: int = DEFAULT_CAPACITY, create: bool = False):
+        self.path: pathlib.Path = path
+
+        if not path.is_file():
+            if not create:
+                raise FileNotFoundError(f"no metrics recorded at {path}")
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            with path.open("wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, capacity, 0).ljust(self.HEADER_SIZE, b"\x00"))
+                f.truncate(self.HEADER_SIZE + capacity * self.RECORD.size)
+
+        self._file = path.open("r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+        magic, self.capacity, _ = self.HEADER.unpack_from(self._map, 0)
+
+        if magic != self.MAGIC or len(self._map) < self.HEADER_SIZE + self.capacity * self.RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a metrics file")
+
+    @property
+    def written(self) -> int:
+        return self.HEADER.unpack_from(self._map, 0)[2]
+
+    def append(self, sample: Sample) -> None:
+        written = self.written
+        self.RECORD.pack_into(self._map, self.HEADER_SIZE + (written % self.capacity) * self.RECORD.size, *sample)
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.capacity, written + 1)
+
+    def samples(self, since: float = 0) -> list[Sample]:
+        written = self.written
+        count = min(written, self.capacity)
+        out = []
+
+        for i in range(written - count, written):
+            sample = Sample(*self.RECORD.unpack_from(self._map, self.HEADER_SIZE + (i % self.capacity) * self.RECORD.size))
+
+            if sample.timestamp >= since:
+                out.append(sample)
+
+        return out
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "MetricsRing":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class MetricsCollector:
+    """
+    Samples all running servers at a fixed interval and appends the samples to their ring buffers
+    """
+
+    def __init__(self, interval: float = 10.0, capacity: int = MetricsRing.DEFAULT_CAPACITY):
+        self.interval: float = interval
+        self.capacity: int = capacity
+        self._rings: dict[str, MetricsRing] = {}
+        self._stop: threading.Event = threading.Event()
+
+    def _ring(self, server_id: str) -> MetricsRing:
+        if server_id not in self._rings:
+            self._rings[server_id] = MetricsRing(MetricsRing.path_for(server_id), self.capacity, create=True)
+
+        return self._rings[server_id]
+
+    def collect(self, servers: Iterable["Server"]) -> None:
+        servers = [s for s in servers if s.running]
+        stats = sample_processes(servers, min(SAMPLE_INTERVAL, self.interval))
+        now = time.time()
+
+        for server in servers:
+            if stats_ := stats.get(server.id):
+                self._ring(server.id).append(Sample(now, stats_.cpu, stats_.rss, stats_.threads, stats_.fds,
+                                                    server.player_count))
+
+    def run(self) -> None:
+        from .server import Server
+        from .util import ScreenRegistry
+
+        try:
+            while not self._stop.is_set():
+                begin = time.monotonic()
+                ScreenRegistry.reload_if_changed()
+                self.collect(Server.get_registered_servers(read_only=True))
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - begin)))
+        finally:
+            for ring in self._rings.values():
+                ring.close()
+
+            self._rings.clear()
+
+    def start(self) -> "MetricsCollector":
+        threading.Thread(target=self.run, name="mcsrv-metrics", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def parse_duration(value: str) -> float:
+    m = DURATION_REGEX.match(value.strip())
+
+    if not m:
+        raise ValueError(f"invalid duration: {value!r}")
+
+    return float(m.group(1)) * DURATION_UNITS[m.group(2)]
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples: list[Sample]) -> dict[str, tuple[float, float, float, float]]:
+    """
+    :return: min, avg, max and p95 of every metric
+    """
+    out = {}
+
+    for field in ("cpu", "rss", "threads", "fds", "players"):
+        values = [getattr(s, field) for s in samples]
+        out[field] = min(values), sum(values) / len(values), max(values), percentile(values, 95)
+
+    return out
+
+
+def read_summary(server_id: str, since: Optional[float] = None) -> tuple[int, dict]:
+    with MetricsRing(MetricsRing.path_for(server_id)) as ring:
+        samples = ring.samples(since or 0)
+
+    return len(samples), summarize(samples) if samples else {}
@@ -0,0 +1,95 @@
+import json
+import os
+import pathlib
+import re
+
+PLAYERS_DIR = pathlib.Path("~/.mcsrvplayers").expanduser()
+PLAYER_EVENT_REGEX = re.compile(r"]: (?P<name>[A-Za-z0-9_.]{1,16}) (?P<event>joined|left) the game$")
+SERVER_STOP_REGEX = re.compile(r"]: Stopping (the )?server$")
+
+
+class PlayerTracker:
+    """
+    Keeps track of the online players of a server by incrementally reading its logs/latest.log
+
+    The byte offset up to which the log has been read and the players that are online at that point are stored in
+    ~/.mcsrvplayers/<id>.json, so every update only reads the lines that were appended since, without writing to the
+    server directory. The state is reset when the log is rotated or truncated.
+    """
+
+    def __init__(self, server_id: str, server_path: pathlib.Path):
+        self.log_path: pathlib.Path = server_path.joinpath("logs", "latest.log")
+        self.state_path: pathlib.Path = PLAYERS_DIR.joinpath(f"{server_id}.json")
+
+    def _load_state(self) -> dict:
+        try:
+            with self.state_path.open("r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        return state if isinstance(state, dict) else {}
+
+    def _save_state(self, state: dict) -> None:
+        tmp = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+
+        try:
+            self.state_path.parent.mkdir(exist_ok=True)
+
+            with tmp.open("w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+    @staticmethod
+    def _apply(players: set[str], line: str) -> None:
+        line = line.rstrip()
+
+        if m := PLAYER_EVENT_REGEX.search(line):
+            if m.group("event") == "joined":
+                players.add(m.group("name"))
+            else:
+                players.discard(m.group("name"))
+        elif SERVER_STOP_REGEX.search(line):
+            players.clear()
+
+    def update(self) -> set[str]:
+        """
+        Reads the new lines of the log
+
+        :return: the names of the players that are currently online
+        """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return set()
+
+        state = self._load_state()
+        offset = state.get("offset", 0)
+        players = set(state.get("players", []))
+
+        if state.get("inode") != st.st_ino or st.st_size < offset:
+            offset = 0
+            players = set()
+
+        if st.st_size == offset and state.get("inode") == st.st_ino:
+            return players
+
+        with self.log_path.open("rb") as f:
+            f.seek(offset)
+            data = f.read(st.st_size - offset)
+
+        # only consume complete lines, a partially written one is read on the next update
+        end = data.rfind(b"\n") + 1
+
+        for line in data[:end].decode("utf-8", "replace").splitlines():
+            self._apply(players, line)
+
+        self._save_state({"inode": st.st_ino, "offset": offset + end, "players": sorted(players)})
+
+        return players
+
+    @property
+    def count(self) -> int:
+        return len(self.update())
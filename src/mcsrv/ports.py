@@ -0,0 +1,177 @@
+import json
+import os
+import pathlib
+import socket
+from typing import Optional
+
+from .properties import ServerProperties
+from .registry import ServerRegistry
+
+PORTS_PATH = pathlib.Path("~/.mcsrvports").expanduser()
+DEFAULT_PORT_RANGE = os.environ.get("MCSRV_PORT_RANGE", "25565-25665")
+
+# property: (protocol, property that enables it, default port)
+PORT_PROPERTIES = {
+    "server-port": ("tcp", None, 25565),
+    "query.port": ("udp", "enable-query", 25565),
+    "rcon.port": ("tcp", "enable-rcon", 25575),
+}
+
+
+def parse_port_range(value: str) -> tuple[int, int]:
+    lo, _, hi = value.partition("-")
+    lo, hi = int(lo), int(hi or lo)
+
+    if not 0 < lo <= hi < 65536:
+        raise ValueError(f"invalid port range: {value}")
+
+    return lo, hi
+
+
+def read_ports(path: pathlib.Path) -> dict[str, int]:
+    """
+    :param path: path of a server.properties
+    :return: dict of the port properties that are in use and their ports
+    """
+    props = ServerProperties(path)
+    out = {}
+
+    for key, (_, enabled_by, default) in PORT_PROPERTIES.items():
+        if enabled_by is not None and (enabled_by not in props or props.get_value(enabled_by) != "true"):
+            continue
+
+        try:
+            out[key] = int(props.get_value(key)) if key in props else default
+        except ValueError:
+            continue
+
+    return out
+
+
+def port_in_use(port: int, protocol: str = "tcp") -> bool:
+    kind = socket.SOCK_STREAM if protocol == "tcp" else socket.SOCK_DGRAM
+
+    with socket.socket(socket.AF_INET, kind) as sock:
+        try:
+            sock.bind(("0.0.0.0", port))
+        except OSError:
+            return True
+
+    return False
+
+
+class PortIndex:
+    """
+    Index of the ports used by every registered server
+
+    The ports are cached in ~/.mcsrvports together with the mtime of the server.properties they were read from, so
+    only changed files are parsed again on `refresh`.
+    """
+
+    def __init__(self, path: pathlib.Path = PORTS_PATH):
+        self.path: pathlib.Path = path
+        self.entries: dict[str, dict] = self._read()
+
+    def _read(self) -> dict[str, dict]:
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    def _write(self) -> None:
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+
+        with tmp.open("w") as f:
+            json.dump(self.entries, f, indent=2)
+
+        os.replace(tmp, self.path)
+
+    def refresh(self) -> "PortIndex":
+        entries = {}
+        changed = False
+
+        for server_id, entry in ServerRegistry.entries().items():
+            props_path = pathlib.Path(entry["path"], "server.properties")
+
+            try:
+                mtime = os.stat(props_path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+
+            cached = self.entries.get(server_id)
+
+            if cached and cached["path"] == entry["path"] and cached["mtime"] == mtime:
+                entries[server_id] = cached
+                continue
+
+            entries[server_id] = {"path": entry["path"], "mtime": mtime,
+                                  "ports": read_ports(props_path) if mtime is not None else {}}
+            changed = True
+
+        if changed or entries.keys() != self.entries.keys():
+            self.entries = entries
+            self._write()
+
+        return self
+
+    def ports(self, server_id: str) -> dict[str, int]:
+        entry = self.entries.get(server_id.lower())
+        return dict(entry["ports"]) if entry else {}
+
+    def used(self, exclude: Optional[str] = None) -> dict[tuple[int, str], list[str]]:
+        """
+        :param exclude: id of a server whose ports are ignored
+        :return: dict of (port, protocol) and the ids of the servers using it
+        """
+        out: dict[tuple[int, str], list[str]] = {}
+
+        for server_id, entry in self.entries.items():
+            if server_id == exclude:
+                continue
+
+            for key, port in entry["ports"].items():
+                owners = out.setdefault((port, PORT_PROPERTIES[key][0]), [])
+
+                if server_id not in owners:
+                    owners.append(server_id)
+
+        return out
+
+    def conflicts(self) -> dict[tuple[int, str], list[str]]:
+        """
+        :return: dict of (port, protocol) used by more than one server and the ids of those servers
+        """
+        return {k: v for k, v in self.used().items() if len(v) > 1}
+
+    def collisions(self, server_id: str, ports: Optional[dict[str, int]] = None) -> list[tuple[str, int, list[str]]]:
+        """
+        :param ports: the ports to check, defaults to the indexed ports of the server
+        :return: list of the port properties of the server that other servers use too, with their ports and ids
+        """
+        used = self.used(exclude=server_id.lower())
+        out = []
+
+        for key, port in (self.ports(server_id) if ports is None else ports).items():
+            owners = used.get((port, PORT_PROPERTIES[key][0]))
+
+            if owners:
+                out.append((key, port, owners))
+
+        return out
+
+    def next_free(self, port_range: tuple[int, int], exclude: Optional[str] = None) -> Optional[int]:
+        """
+        :param port_range: lowest and highest port to consider
+        :param exclude: id of a server whose ports count as free
+        :return: the lowest port in the range that no server uses and nothing on this host is bound to
+        """
+        used = {port for port, _ in self.used(exclude=exclude)}
+
+        for port in range(port_range[0], port_range[1] + 1):
+            if port not in used and not port_in_use(port):
+                return port
+
+        return None
@@ -1,4 +1,63 @@
+import os
 import pathlib
+import shutil
+
+
+def rewrite_properties(path: pathlib.Path, changes: dict[str, str]) -> bool:
+    """
+    Sets keys of a properties file, keeping all other lines as they are
+
+    The file is streamed into a temporary file next to it, which replaces the original only if a value actually
+    changed. Keys that aren't defined yet are appended.
+
+    :param path: the properties file, which is created if it doesn't exist
+    :param changes: dict of keys and their new values
+    :return: whether the file was changed
+    """
+    remaining = dict(changes)
+    changed = False
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+    try:
+        with tmp.open("w", newline="") as out:
+            last = "\n"
+
+            if path.is_file():
+                with path.open("r", newline="") as f:
+                    for line in f:
+                        last = line
+                        stripped = line.strip()
+
+                        if not stripped.startswith("#") and "=" in stripped:
+                            key, _, value = stripped.partition("=")
+
+                            if key in remaining:
+                                new_value = remaining.pop(key)
+
+                                if new_value != value:
+                                    ending = line[len(line.rstrip("\r\n")):]
+                                    line = f"{key}={new_value}{ending}"
+                                    changed = True
+
+                        out.write(line)
+
+                shutil.copymode(path, tmp)
+
+            if remaining:
+                changed = True
+
+                if not last.endswith("\n"):
+                    out.write("\n")
+
+                for key, value in remaining.items():
+                    out.write(f"{key}={value}\n")
+
+        if changed:
+            os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return changed
 
 
 class ServerProperties:
@@ -7,10 +66,7 @@ class ServerProperties:
         self._data: dict[str, str] = {}
         self._changed_keys: set[str] = set()
 
-        with self.path.open("r") as f:
-            data = f.readlines()
-
-        for i, line in enumerate(data):
+        for i, line in enumerate(self._read_lines()):
             line = line.strip()
 
             if line.startswith("#"):
@@ -35,33 +91,14 @@ class ServerProperties:
     def __contains__(self, item):
         return item in self._data
 
-    def save(self):
-        with self.path.open("r") as f:
-            data = f.readlines()
-
-        output = []
-
-        for line in data:
-            line = line.strip()
-            if line.startswith("#") or "=" not in line:
-                output.append(line)
-                continue
-
-            eq_index = line.find("=")
-            key = line[:eq_index]
-            if key in self._changed_keys:
-                output.append(f"{key}={self._data[key]}")
-                self._changed_keys.remove(key)
-                continue
+    def _read_lines(self) -> list[str]:
+        if not self.path.is_file():
+            return []
 
-            output.append(line)
-
-        for key in self._changed_keys:
-            output.append(f"{key}={self._data[key]}")
-
-        with self.path.open("w") as f:
-            for line in output:
-                f.write(line)
-                f.write("\n")
+        with self.path.open("r") as f:
+            return f.readlines()
 
+    def save(self) -> bool:
+        changed = rewrite_properties(self.path, {k: self._data[k] for k in self._changed_keys})
         self._changed_keys.clear()
+        return changed
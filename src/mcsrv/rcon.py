@@ -0,0 +1,185 @@
+import re
+import socket
+import struct
+import threading
+from typing import Union, TYPE_CHECKING
+
+from .console import ConsoleChannel
+
+if TYPE_CHECKING:
+    from .server import Server
+
+PACKET_RESPONSE = 0
+PACKET_COMMAND = 2
+PACKET_LOGIN = 3
+
+
+class RconError(Exception):
+    pass
+
+
+class RconConnectError(RconError):
+    """
+    Raised if connecting or logging in failed, so no command has been sent
+    """
+
+
+class RconClient:
+    """
+    Minimal client for the Source RCON protocol that vanilla Minecraft servers implement
+    """
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = 5.0):
+        self.host: str = host
+        self.port: int = port
+        self.password: str = password
+        self.timeout: float = timeout
+        self.lock: threading.Lock = threading.Lock()
+        self._sock: Union[socket.socket, None] = None
+        self._request_id: int = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def connect(self) -> None:
+        try:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            request_id = self._send(PACKET_LOGIN, self.password)
+            response_id, _, _ = self._recv()
+        except (OSError, struct.error, RconError) as e:
+            self.close()
+            raise RconConnectError(f"can't connect to {self.host}:{self.port}: {e}") from e
+
+        if response_id == -1 or response_id != request_id:
+            self.close()
+            raise RconConnectError(f"authentication at {self.host}:{self.port} failed")
+
+    def ensure_connected(self) -> None:
+        with self.lock:
+            if not self.connected:
+                self.connect()
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def _send(self, packet_type: int, payload: str) -> int:
+        self._request_id = self._request_id % 0x7fffffff + 1
+        body = struct.pack("<ii", self._request_id, packet_type) + payload.encode("utf-8") + b"\x00\x00"
+        self._sock.sendall(struct.pack("<i", len(body)) + body)
+        return self._request_id
+
+    def _recv_exactly(self, n: int) -> bytes:
+        data = b""
+
+        while len(data) < n:
+            chunk = self._sock.recv(n - len(data))
+
+            if not chunk:
+                raise RconError("connection closed by server")
+
+            data += chunk
+
+        return data
+
+    def _recv(self) -> tuple[int, int, str]:
+        length, = struct.unpack("<i", self._recv_exactly(4))
+        body = self._recv_exactly(length)
+        request_id, packet_type = struct.unpack("<ii", body[:8])
+        return request_id, packet_type, body[8:-2].decode("utf-8", "replace")
+
+    def command(self, cmd: str) -> str:
+        with self.lock:
+            if not self.connected:
+                self.connect()
+
+            try:
+                request_id = self._send(PACKET_COMMAND, cmd)
+                # the server answers requests of unknown type with a single packet, which marks the end of the
+                # possibly fragmented response to the command
+                marker_id = self._send(PACKET_RESPONSE, "")
+
+                out = []
+
+                while True:
+                    response_id, _, payload = self._recv()
+
+                    if response_id == marker_id:
+                        return "".join(out)
+
+                    if response_id == request_id:
+                        out.append(payload)
+            except (OSError, struct.error, RconError):
+                self.close()
+                raise
+
+
+class RconPool:
+    """
+    Persistent RCON connections shared by everything in the process, one per server address
+    """
+    _clients: dict[tuple[str, int, str], RconClient] = {}
+    _lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def get(cls, host: str, port: int, password: str) -> RconClient:
+        with cls._lock:
+            key = host, port, password
+
+            if key not in cls._clients:
+                cls._clients[key] = RconClient(host, port, password)
+
+            return cls._clients[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._lock:
+            for client in cls._clients.values():
+                client.close()
+
+            cls._clients.clear()
+
+
+class RconChannel(ConsoleChannel):
+    """
+    Console channel that talks to the server over RCON and falls back to screen if the connection can't be established
+
+    Once a command may have reached the server, errors are raised instead of falling back, so no command runs twice.
+    """
+
+    def __init__(self, server: "Server", host: str, port: int, password: str):
+        super().__init__(server)
+        self.client: RconClient = RconPool.get(host, port, password)
+
+    def _connected(self) -> bool:
+        try:
+            self.client.ensure_connected()
+        except RconConnectError:
+            return False
+
+        return True
+
+    def _execute(self, *commands: str) -> list[str]:
+        out = []
+
+        for cmd in commands:
+            out.extend(self.client.command(cmd).splitlines())
+
+        return out
+
+    def send(self, *commands: str) -> None:
+        if not self._connected():
+            super().send(*commands)
+            return
+
+        self._execute(*commands)
+
+    def request(self, *commands: str, timeout: float = 2.0, until: Union[str, re.Pattern, None] = None) -> list[str]:
+        if not self._connected():
+            return super().request(*commands, timeout=timeout, until=until)
+
+        return self._execute(*commands)
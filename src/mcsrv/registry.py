@@ -0,0 +1,152 @@
+import contextlib
+import fcntl
+import json
+import os
+import pathlib
+from typing import Iterator, Optional
+
+LEGACY_RC_PATH = pathlib.Path("~/.mcsrv").expanduser()
+RC_PATH = pathlib.Path("~/.mcsrv.json").expanduser()
+LOCK_PATH = pathlib.Path("~/.mcsrv.lock").expanduser()
+CACHED_META_KEYS = ("launch-method", "ram", "autostart", "java-bin")
+
+
+class ServerRegistry:
+    """
+    Index of all registered servers by their id
+
+    Every entry holds the server path and a copy of some of its metadata, so servers can be looked up without touching
+    the directories of other servers. Changes are done while holding an exclusive lock on ~/.mcsrv.lock and written
+    atomically. The old line-based ~/.mcsrv is imported when no index exists yet.
+    """
+    _entries: Optional[dict[str, dict]] = None
+    _mtime: Optional[int] = None
+
+    @staticmethod
+    def _source_mtime() -> Optional[int]:
+        for path in (RC_PATH, LEGACY_RC_PATH):
+            try:
+                return os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+        return None
+
+    @classmethod
+    def _read_legacy(cls) -> dict[str, dict]:
+        entries = {}
+
+        if not LEGACY_RC_PATH.is_file():
+            return entries
+
+        with LEGACY_RC_PATH.open("r") as f:
+            for line in f.readlines():
+                path = line.strip()
+
+                if path:
+                    entries.setdefault(pathlib.Path(path).name.lower(), {"path": path, "meta": {}})
+
+        return entries
+
+    @classmethod
+    def _read(cls) -> dict[str, dict]:
+        if not RC_PATH.is_file():
+            return cls._read_legacy()
+
+        try:
+            with RC_PATH.open("r") as f:
+                data = json.load(f)
+        except ValueError:
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    @classmethod
+    def _write(cls, entries: dict[str, dict]) -> None:
+        tmp = RC_PATH.with_name(f"{RC_PATH.name}.{os.getpid()}.tmp")
+
+        with tmp.open("w") as f:
+            json.dump(entries, f, indent=2)
+
+        os.replace(tmp, RC_PATH)
+
+    @classmethod
+    @contextlib.contextmanager
+    def _update(cls) -> Iterator[dict[str, dict]]:
+        with LOCK_PATH.open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                entries = cls._read()
+                before = json.dumps(entries, sort_keys=True)
+
+                yield entries
+
+                if json.dumps(entries, sort_keys=True) != before or not RC_PATH.is_file():
+                    cls._write(entries)
+
+                cls._entries = entries
+                cls._mtime = cls._source_mtime()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @classmethod
+    def entries(cls) -> dict[str, dict]:
+        if cls._entries is None:
+            cls._mtime = cls._source_mtime()
+            cls._entries = cls._read()
+
+        return cls._entries
+
+    @classmethod
+    def reload_if_changed(cls) -> None:
+        if cls._source_mtime() != cls._mtime:
+            cls._entries = None
+
+    @classmethod
+    def paths(cls) -> list[str]:
+        return [entry["path"] for entry in cls.entries().values()]
+
+    @classmethod
+    def get_path(cls, server_id: str) -> Optional[str]:
+        entry = cls.entries().get(server_id.lower())
+        return entry["path"] if entry else None
+
+    @classmethod
+    def get_meta(cls, server_id: str) -> dict[str, str]:
+        entry = cls.entries().get(server_id.lower())
+        return dict(entry["meta"]) if entry else {}
+
+    @classmethod
+    def add(cls, server_id: str, path: str, meta: dict[str, str]) -> None:
+        with cls._update() as entries:
+            entries[server_id.lower()] = {"path": path, "meta": cls._cached_meta(meta)}
+
+    @classmethod
+    def update_meta(cls, server_id: str, path: str, meta: dict[str, str]) -> None:
+        entry = cls.entries().get(server_id.lower())
+        meta = cls._cached_meta(meta)
+
+        if not entry or entry["path"] != path or entry["meta"] == meta:
+            return
+
+        with cls._update() as entries:
+            entry = entries.get(server_id.lower())
+
+            if entry and entry["path"] == path:
+                entry["meta"] = meta
+
+    @classmethod
+    def remove_paths(cls, paths: list[str]) -> None:
+        if len(paths) == 0:
+            return
+
+        to_remove = set(paths)
+
+        with cls._update() as entries:
+            for server_id in [k for k, v in entries.items() if v["path"] in to_remove]:
+                del entries[server_id]
+
+    @staticmethod
+    def _cached_meta(meta: dict[str, str]) -> dict[str, str]:
+        return {k: meta[k] for k in CACHED_META_KEYS if meta.get(k) is not None}
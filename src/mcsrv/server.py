@@ -1,57 +1,60 @@
 import pathlib
-import re
 import shutil
 import subprocess
 import time
 from functools import cached_property
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 import click.exceptions
 import colorama
-import psutil
 from click import echo
 from colorama import Fore, Back
 
+from .console import ConsoleChannel
 from .javaexecutable import JavaExecutable
 from .launch import LaunchMethod, LaunchMethodManager
+from .players import PlayerTracker
 from .properties import ServerProperties
-from .util import get_running_screens, Screen, clean_path, check_ram_argument, print_warning, format_bool_indicator
+from .rcon import RconChannel, RconError
+from .registry import ServerRegistry
+from .stats import collect_stats
+from .util import ScreenRegistry, Screen, clean_path, check_ram_argument, print_warning, format_bool_indicator
+
+if TYPE_CHECKING:
+    import psutil
 
-RC_PATH = pathlib.Path("~/.mcsrv").expanduser()
 ALL_LIST_PROPERTIES = "ripatxojm"
-PLAYER_COUNT_REGEX = re.compile(r"\[.*\][^0-9]+([0-9]+)")
+LIST_RECORD_FIELDS = {
+    "r": ("running",),
+    "i": ("id",),
+    "p": ("path",),
+    "a": ("autostart",),
+    "t": ("type",),
+    "x": ("cpu", "ram"),
+    "o": ("port",),
+    "j": ("java",),
+    "m": ("allocated_ram",),
+}
 
 
 class Server:
     @classmethod
     def get_cached_server_paths(cls) -> list[str]:
-        if not RC_PATH.is_file():
-            return []
-
-        with RC_PATH.open("r") as f:
-            return list(map(str.strip, f.readlines()))
+        return ServerRegistry.paths()
 
     @classmethod
     def unregister_paths(cls, paths: list[str]) -> None:
-        if len(paths) == 0:
-            return
-
-        registered = set(cls.get_cached_server_paths())
-        to_remove = set(paths)
-
-        with RC_PATH.open("w") as f:
-            for valid_server in registered - to_remove:
-                f.write(f"{valid_server}\n")
+        ServerRegistry.remove_paths(paths)
 
     @classmethod
-    def get_registered_servers(cls) -> list["Server"]:
+    def get_registered_servers(cls, read_only: bool = False) -> list["Server"]:
         paths = cls.get_cached_server_paths()
         out = []
         invalid = []
 
         for p in paths:
             try:
-                out.append(Server(p))
+                out.append(Server(p, read_only=read_only))
             except FileNotFoundError:
                 echo(f"mcsrv: warn: {Fore.YELLOW}Server directory {p} not existing, removing it{Fore.RESET}")
                 invalid.append(p)
@@ -61,23 +64,34 @@ class Server:
         return out
 
     @classmethod
-    def get_by_id(cls, server_id: str):
-        for path in cls.get_cached_server_paths():
-            if pathlib.Path(path).name == server_id:
-                return Server(path)
-        return None
+    def get_by_id(cls, server_id: str, read_only: bool = False):
+        path = ServerRegistry.get_path(server_id)
 
-    def __init__(self, path: str) -> None:
+        if path is None:
+            return None
+
+        return Server(path, read_only=read_only)
+
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        """
+        :param path: the directory of the server
+        :param read_only: don't validate the launch method and persist the metadata on load. Both happen on demand,
+            the metadata is only written when it was changed.
+        """
         self.path: pathlib.Path = clean_path(pathlib.Path(path).absolute())
 
         if not self.path.is_dir():
             raise FileNotFoundError(f"Invalid server path: {self.path!r}")
 
+        self.read_only: bool = read_only
         self.data: dict[str, str] = {}
+        self._saved_data: dict[str, str] = {}
 
         self._load_data()
-        self.launch_method_instance: LaunchMethod = self.ensure_valid_launch_method()
-        self.save_data()
+
+        if not read_only:
+            _ = self.launch_method_instance
+            self.save_data()
 
     @property
     def running(self) -> bool:
@@ -136,6 +150,30 @@ class Server:
         self.data["autostart"] = "true" if val else "false"
         self.save_data()
 
+    @property
+    def autostart_priority(self) -> int:
+        try:
+            return int(self.data.get("autostart-priority", "0"))
+        except ValueError:
+            return 0
+
+    @autostart_priority.setter
+    def autostart_priority(self, val: int) -> None:
+        self.data["autostart-priority"] = str(val)
+        self.save_data()
+
+    @property
+    def autostart_delay(self) -> float:
+        try:
+            return max(0.0, float(self.data.get("autostart-delay", "0")))
+        except ValueError:
+            return 0.0
+
+    @autostart_delay.setter
+    def autostart_delay(self, val: float) -> None:
+        self.data["autostart-delay"] = str(val)
+        self.save_data()
+
     @property
     def launch_method(self) -> tuple[str, str]:
         return self.data.get("launch-method", None), self.data.get("launch-args", None)
@@ -147,18 +185,51 @@ class Server:
         self.data["launch-args"] = args
         self.save_data()
 
-    @cached_property
+    @property
     def screen_handle(self) -> Optional[Screen]:
-        for screen in get_running_screens():
-            if screen.name == self.screen_name:
-                return screen
-        return None
+        return ScreenRegistry.get(self.screen_name)
+
+    @property
+    def rcon_address(self) -> Optional[tuple[str, int, str]]:
+        props = self.properties
+
+        if "enable-rcon" not in props or props.get_value("enable-rcon") != "true":
+            return None
+
+        password = props.get_value("rcon.password") if "rcon.password" in props else ""
+
+        if not password:
+            return None
+
+        try:
+            port = int(props.get_value("rcon.port")) if "rcon.port" in props else 25575
+        except ValueError:
+            return None
+
+        host = props.get_value("server-ip") if "server-ip" in props else ""
+
+        return host or "127.0.0.1", port, password
+
+    @property
+    def console(self) -> ConsoleChannel:
+        if rcon := self.rcon_address:
+            return RconChannel(self, *rcon)
+
+        return ConsoleChannel(self)
+
+    @cached_property
+    def launch_method_instance(self) -> LaunchMethod:
+        return self.ensure_valid_launch_method()
+
+    @property
+    def dirty(self) -> bool:
+        return self.data != self._saved_data
 
     @cached_property
     def properties(self) -> ServerProperties:
         path = self.path.joinpath("server.properties")
 
-        if not path.is_file():
+        if not self.read_only and not path.is_file():
             path.touch()
 
         return ServerProperties(path)
@@ -189,55 +260,54 @@ class Server:
         if not self.running:
             return 0
 
-        self.screen_handle.send_command("list")
-        time.sleep(.05)
-        out = self.screen_handle.get_last_stdout_lines()
-
-        for i, content in enumerate(out):
-            if not content.endswith("list\n"):
-                continue
-
-            m = PLAYER_COUNT_REGEX.match(out[i + 1])
-
-            if not m:
-                continue
-
-            return int(m.group(1))
-
-        return 0
+        return PlayerTracker(self.id, self.path).count
 
     def print(self, msg: str) -> None:
         echo(f"mcsrv: {self.id}: {msg}{colorama.Style.RESET_ALL}")
 
     def register(self) -> "Server":
         # check if my id is already saved in another path
-        servers = self.get_registered_servers()
+        other_path = ServerRegistry.get_path(self.id)
 
-        for other in servers:
-            if other.id == self.id:
-                # same server
-                if str(other.path) == str(self.path):
-                    return self
+        # same server
+        if other_path == str(self.path):
+            return self
 
-                # other server with same id
-                self.print(
-                    f"{Fore.RED}There is already a server with id {self.id!r} at {other.path!r}. Rename this or that directory!")
-                raise click.exceptions.Exit(code=1)
+        # other server with same id
+        if other_path is not None and pathlib.Path(other_path).is_dir():
+            self.print(
+                f"{Fore.RED}There is already a server with id {self.id!r} at {other_path!r}. Rename this or that directory!")
+            raise click.exceptions.Exit(code=1)
 
-        # append server if not
-        with RC_PATH.open("a" if RC_PATH.is_file() else "w") as f:
-            f.write(f"{self.path}\n")
+        ServerRegistry.add(self.id, str(self.path), self.data)
 
         return self
 
-    def get_stats(self) -> tuple[float, float]:
+    @property
+    def java_process(self) -> Optional["psutil.Process"]:
         if not self.running:
-            return 0, 0
+            return None
 
-        proc: psutil.Process = psutil.Process(self.screen_handle.pid).children()[0]
-        return proc.cpu_percent(interval=2.0), round(proc.memory_info().rss / 1000000000, 2)
+        import psutil
+
+        try:
+            children = psutil.Process(self.screen_handle.pid).children()
+        except psutil.NoSuchProcess:
+            return None
+
+        return children[0] if children else None
+
+    def get_stats(self) -> tuple[float, float]:
+        return collect_stats([self])[self.id]
 
     def start(self, ram: str = None) -> None:
+        subprocess.run(self.get_start_command(ram), cwd=self.path.absolute())
+        ScreenRegistry.invalidate()
+
+    def get_start_command(self, ram: str = None) -> list[str]:
+        """
+        Prepares the server directory for a start and builds the command that starts the server in a screen session
+        """
         if ram:
             ram = check_ram_argument(ram)
         else:
@@ -253,13 +323,13 @@ class Server:
             with eula.open("w") as f:
                 f.write("eula=true")
 
-        # invalidate screen handle which is a cached property
-        self.__dict__.pop("screen_handle", None)
+        # a manual start ends the give-up state of the supervisor
+        if self.data.pop("crash-loop", None) is not None:
+            self.save_data()
 
         self.print(f"Starting {self.launch_method_instance.METHOD} with {ram}B RAM")
-        cmd = ["screen", "-d", "-S", self.screen_name, "-m",
-               *self.launch_method_instance.get_command(self.java_bin_path, ram)]
-        subprocess.run(cmd, cwd=self.path.absolute())
+        return ["screen", "-d", "-S", self.screen_name, "-m",
+                *self.launch_method_instance.get_command(self.java_bin_path, ram)]
 
     def ensure_valid_launch_method(self) -> LaunchMethod:
         method = LaunchMethodManager.get_method(self)
@@ -281,12 +351,19 @@ class Server:
         self.screen_handle.attach()
 
     def save_data(self) -> None:
+        if not self.dirty:
+            return
+
         with self.datafile.open("w") as f:
             for key, val in self.data.items():
                 f.write(f"{key}={val}\n")
 
+        self._saved_data = dict(self.data)
+        ServerRegistry.update_meta(self.id, str(self.path), self.data)
+
     def _load_data(self) -> None:
         self.data = {}
+        self._saved_data = {}
 
         if not self.datafile.is_file():
             self.print(f"{Fore.YELLOW}No .mcsrvmeta file found")
@@ -305,6 +382,8 @@ class Server:
 
                 self.data[res[0]] = res[1]
 
+        self._saved_data = dict(self.data)
+
     def print_restart_note(self) -> None:
         if not self.running:
             return
@@ -312,9 +391,38 @@ class Server:
         self.print(f"{Fore.YELLOW}note that you must restart the server for changes to take effect{Fore.RESET}")
 
     def stop(self) -> None:
-        self.screen_handle.send_command("stop")
+        self.mark_stop_requested()
 
-    def get_list_data(self, fmt: str = ALL_LIST_PROPERTIES, plain: bool = False) -> list[str]:
+        try:
+            self.console.send("stop")
+        except (OSError, RconError):
+            # the server may close the rcon connection while shutting down, before the reply arrives
+            pass
+
+        ScreenRegistry.invalidate()
+
+    def mark_stop_requested(self) -> None:
+        """
+        Remembers that the server is being stopped on purpose, so the supervisor doesn't restart it
+        """
+        self.data["last-stop"] = str(int(time.time()))
+        self.save_data()
+
+    @property
+    def restart_info(self) -> str:
+        restarts = self.data.get("restarts", "0")
+        out = f"{restarts} automatic restarts"
+
+        if last_crash := self.data.get("last-crash"):
+            out += f", last crash {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(last_crash)))}"
+
+        if self.data.get("crash-loop") == "true":
+            out += ", gave up (crash loop)"
+
+        return out
+
+    def get_list_data(self, fmt: str = ALL_LIST_PROPERTIES, plain: bool = False,
+                      stats: Optional[tuple[float, float]] = None) -> list[str]:
         out = []
 
         if "r" in fmt:  # Running
@@ -333,7 +441,7 @@ class Server:
             out.append(self.launch_method[0])
 
         if "x" in fmt:  # Performance
-            cpu, ram = self.get_stats()
+            cpu, ram = stats if stats is not None else self.get_stats()
             out.append(f"{cpu}% {ram}GB")
 
         if "o" in fmt:  # Port
@@ -346,3 +454,39 @@ class Server:
             out.append(self.ram)
 
         return out
+
+    def get_list_record(self, fmt: str = ALL_LIST_PROPERTIES,
+                        stats: Optional[tuple[float, float]] = None) -> dict[str, object]:
+        """
+        Like `get_list_data`, but with unformatted values keyed by the field names in `LIST_RECORD_FIELDS`
+        """
+        out = {}
+
+        if "r" in fmt:
+            out["running"] = self.running
+
+        if "i" in fmt:
+            out["id"] = self.id
+
+        if "p" in fmt:
+            out["path"] = str(self.path)
+
+        if "a" in fmt:
+            out["autostart"] = self.autostarts
+
+        if "t" in fmt:
+            out["type"] = self.launch_method[0]
+
+        if "x" in fmt:
+            out["cpu"], out["ram"] = stats if stats is not None else self.get_stats()
+
+        if "o" in fmt:
+            out["port"] = self.properties.get_value("server-port") if "server-port" in self.properties else None
+
+        if "j" in fmt:
+            out["java"] = self.java_executable.version
+
+        if "m" in fmt:
+            out["allocated_ram"] = self.ram
+
+        return out
@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Callable, Iterable, NamedTuple, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import psutil
+
+    from .server import Server
+
+SAMPLE_INTERVAL = 2.0
+
+
+class ProcessStats(NamedTuple):
+    cpu: float
+    rss: int
+    threads: int
+    fds: int
+
+
+def sample_processes(servers: Iterable["Server"], interval: float = SAMPLE_INTERVAL) -> dict[str, ProcessStats]:
+    """
+    Measures the java processes of multiple servers using a single shared sampling window
+
+    cpu_percent is first primed for the java process of every running server, then all processes are read after
+    waiting for `interval` seconds once, so the total cost doesn't grow with the server count.
+
+    :param servers: the servers to measure
+    :param interval: length of the cpu sampling window in seconds
+    :return: dict of the ids of running servers and the stats of their java process
+    """
+    import psutil
+
+    out: dict[str, ProcessStats] = {}
+    procs: dict[str, "psutil.Process"] = {}
+
+    for server in servers:
+        proc = server.java_process
+
+        if proc is None:
+            continue
+
+        try:
+            proc.cpu_percent(None)
+        except psutil.Error:
+            continue
+
+        procs[server.id] = proc
+
+    if not procs:
+        return out
+
+    time.sleep(interval)
+
+    for server_id, proc in procs.items():
+        try:
+            with proc.oneshot():
+                out[server_id] = ProcessStats(proc.cpu_percent(None), proc.memory_info().rss, proc.num_threads(),
+                                              proc.num_fds())
+        except psutil.Error:
+            pass
+
+    return out
+
+
+def collect_stats(servers: Iterable["Server"], interval: float = SAMPLE_INTERVAL) -> dict[str, tuple[float, float]]:
+    """
+    :return: dict of server ids and their (cpu percent, rss in GB), measured by `sample_processes`
+    """
+    servers = list(servers)
+    samples = sample_processes(servers, interval)
+    out = {}
+
+    for server in servers:
+        sample = samples.get(server.id)
+        out[server.id] = (sample.cpu, round(sample.rss / 1000000000, 2)) if sample else (0, 0)
+
+    return out
+
+
+class StatsSampler:
+    """
+    Keeps measuring the stats of servers in a background thread, so they can be read without waiting for a sample
+    """
+
+    def __init__(self, get_servers: Callable[[], Iterable["Server"]], interval: float = SAMPLE_INTERVAL):
+        self.get_servers: Callable[[], Iterable["Server"]] = get_servers
+        self.interval: float = interval
+        self.processes: dict[str, ProcessStats] = {}
+        self.updated: float = 0
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StatsSampler":
+        self._thread = threading.Thread(target=self._run, name="mcsrv-stats", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            begin = time.monotonic()
+
+            try:
+                self.processes = sample_processes(self.get_servers(), self.interval)
+                self.updated = time.time()
+            except Exception:
+                pass
+
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - begin)))
+
+    def get(self, server_id: str) -> tuple[float, float]:
+        sample = self.processes.get(server_id)
+        return (sample.cpu, round(sample.rss / 1000000000, 2)) if sample else (0, 0)
@@ -0,0 +1,176 @@
+import errno
+import fcntl
+import hashlib
+import os
+import pathlib
+import shutil
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+
+STORE_DIR = pathlib.Path(os.environ.get("MCSRV_STORE_DIR", "~/.mcsrvstore")).expanduser()
+DEDUPE_GLOBS = ("*.jar", "libraries/**/*")
+MIN_SIZE = 4096
+FICLONE = 0x40049409
+
+
+class DedupeResult(NamedTuple):
+    files: int
+    linked: int
+    saved: int
+
+
+def _hash_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+
+    with path.open("rb") as f:
+        while block := f.read(1024 * 1024):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def _reflink(source: pathlib.Path, target: pathlib.Path) -> None:
+    with source.open("rb") as src, target.open("wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _link_or_reflink(source: pathlib.Path, target: pathlib.Path) -> None:
+    """
+    Atomically replaces `target` with a hardlink to `source`, or a reflink if it can't be hardlinked
+    """
+    tmp = target.with_name(f".{target.name}.mcsrvlink")
+    tmp.unlink(missing_ok=True)
+
+    try:
+        os.link(source, tmp)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM):
+            raise
+
+        try:
+            _reflink(source, tmp)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        shutil.copymode(source, tmp)
+
+    os.replace(tmp, target)
+
+
+def iter_dedupe_files(server_path: pathlib.Path) -> Iterator[pathlib.Path]:
+    """
+    :return: iterator of the jars and libraries of a server that are worth sharing
+    """
+    for pattern in DEDUPE_GLOBS:
+        for path in server_path.glob(pattern):
+            try:
+                st = path.lstat()
+            except FileNotFoundError:
+                continue
+
+            if stat.S_ISREG(st.st_mode) and st.st_size >= MIN_SIZE:
+                yield path
+
+
+class SharedStore:
+    """
+    Content-addressed store of server jars and libraries that are hardlinked into the server directories
+
+    Objects are named by their sha256 and made read-only, because a write through any of the links would change the
+    file for every server. Links have to be broken with `unshare` before files are replaced in place.
+    """
+
+    def __init__(self, root: pathlib.Path = STORE_DIR):
+        self.root: pathlib.Path = root
+
+    def object_path(self, digest: str) -> pathlib.Path:
+        return self.root.joinpath(digest[:2], digest[2:])
+
+    def link(self, path: pathlib.Path) -> tuple[bool, int]:
+        """
+        Moves a file into the store if it isn't there yet and links it back to its place
+
+        :return: whether the file now shares its data with the store, and the bytes saved by it
+        """
+        st = path.stat()
+        digest = _hash_file(path)
+        obj = self.object_path(digest)
+
+        try:
+            obj_st = obj.stat()
+        except FileNotFoundError:
+            obj.parent.mkdir(parents=True, exist_ok=True)
+
+            try:
+                # adopt the file as the object, no copy needed
+                os.link(path, obj)
+            except FileExistsError:
+                pass
+            except OSError:
+                tmp = obj.with_name(f"{obj.name}.{os.getpid()}.tmp")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, obj)
+
+            os.chmod(obj, 0o444)
+            obj_st = obj.stat()
+
+        if (obj_st.st_dev, obj_st.st_ino) == (st.st_dev, st.st_ino):
+            return True, 0
+
+        try:
+            _link_or_reflink(obj, path)
+        except OSError:
+            return False, 0
+
+        # the data is only freed if no other name kept the old file alive
+        return True, st.st_size if st.st_nlink == 1 else 0
+
+    def dedupe(self, server_path: pathlib.Path, workers: Optional[int] = None) -> DedupeResult:
+        files = list(iter_dedupe_files(server_path))
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(self.link, files))
+
+        return DedupeResult(len(files), sum(1 for ok, _ in results if ok), sum(saved for _, saved in results))
+
+    def prune(self) -> tuple[int, int]:
+        """
+        Deletes objects that aren't linked into any server anymore
+
+        :return: the number of deleted objects and their size
+        """
+        count = size = 0
+
+        for obj in self.root.glob("*/*"):
+            st = obj.lstat()
+
+            if stat.S_ISREG(st.st_mode) and st.st_nlink == 1 and not obj.name.endswith(".tmp"):
+                obj.unlink()
+                count += 1
+                size += st.st_size
+
+        return count, size
+
+
+def unshare(server_path: pathlib.Path) -> int:
+    """
+    Replaces the hardlinked jars and libraries of a server by private copies, so they can be overwritten safely
+
+    :return: the number of files that were copied
+    """
+    count = 0
+
+    for path in iter_dedupe_files(server_path):
+        if path.stat().st_nlink == 1:
+            continue
+
+        tmp = path.with_name(f".{path.name}.mcsrvunshare")
+        shutil.copyfile(path, tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+        count += 1
+
+    return count
@@ -0,0 +1,237 @@
+import os
+import selectors
+import time
+from typing import Optional, TYPE_CHECKING
+
+from click import echo
+from colorama import Fore
+
+from .players import SERVER_STOP_REGEX
+from .server import Server
+from .util import ScreenRegistry
+
+if TYPE_CHECKING:
+    import psutil
+
+LOG_TAIL_SIZE = 64 * 1024
+CRASH_MARKER = "Encountered an unexpected exception"
+
+
+def stopped_cleanly(server_path: str) -> bool:
+    """
+    :return: whether the end of logs/latest.log shows that the server stopped itself, e.g. by /stop in game
+    """
+    try:
+        with open(os.path.join(server_path, "logs", "latest.log"), "rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - LOG_TAIL_SIZE))
+            lines = f.read().decode("utf-8", "replace").splitlines()
+    except OSError:
+        return False
+
+    # the server logs that it stops after crashing as well
+    return not any(CRASH_MARKER in line for line in lines) and any(SERVER_STOP_REGEX.search(line) for line in lines)
+
+
+class Watch:
+    """
+    The processes of a running server the supervisor waits on
+    """
+
+    def __init__(self, server: Server, procs: list["psutil.Process"]):
+        self.path: str = str(server.path)
+        self.id: str = server.id
+        self.procs: list["psutil.Process"] = procs
+        self.since: float = time.time()
+        self.fds: list[int] = []
+
+    @property
+    def alive(self) -> bool:
+        import psutil
+
+        try:
+            return all(p.is_running() and p.status() != psutil.STATUS_ZOMBIE for p in self.procs)
+        except psutil.NoSuchProcess:
+            return False
+
+    def close(self) -> None:
+        for fd in self.fds:
+            os.close(fd)
+
+        self.fds.clear()
+
+
+class Supervisor:
+    """
+    Restarts crashed autostart servers
+
+    The screen process and the java process of every running autostart server are waited on through pidfds, so
+    exits are noticed immediately without polling. Where pidfds aren't available the processes are checked every
+    `FALLBACK_POLL_INTERVAL` seconds. A server that exits without having been stopped through mcsrv is restarted after
+    an exponential backoff. If it crashes `crash_limit` times within `crash_window` seconds, the supervisor gives up
+    until it is started manually. Crashes and restarts are recorded in .mcsrvmeta.
+    """
+    FALLBACK_POLL_INTERVAL = 2.0
+
+    def __init__(self, backoff: float = 5.0, max_backoff: float = 300.0, crash_limit: int = 5,
+                 crash_window: float = 600.0, rescan_interval: float = 30.0):
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+        self.crash_limit: int = crash_limit
+        self.crash_window: float = crash_window
+        self.rescan_interval: float = rescan_interval
+        self.watches: dict[str, Watch] = {}
+        self.crashes: dict[str, list[float]] = {}
+        self.pending: dict[str, tuple[str, float]] = {}
+        self.selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self.use_pidfd: bool = hasattr(os, "pidfd_open")
+
+    @staticmethod
+    def log(server_id: str, msg: str) -> None:
+        echo(f"mcsrv: supervisor: {time.strftime('%H:%M:%S')} {server_id}: {msg}")
+
+    def watch(self, server: Server) -> None:
+        import psutil
+
+        screen = server.screen_handle
+
+        try:
+            screen_proc = psutil.Process(screen.pid)
+            procs = [screen_proc, *screen_proc.children()]
+        except (psutil.NoSuchProcess, AttributeError):
+            return
+
+        watch = Watch(server, procs)
+
+        if self.use_pidfd:
+            try:
+                for proc in procs:
+                    fd = os.pidfd_open(proc.pid)
+                    watch.fds.append(fd)
+                    self.selector.register(fd, selectors.EVENT_READ, watch)
+            except OSError:
+                self.use_pidfd = False
+
+        self.watches[watch.id] = watch
+
+    def unwatch(self, watch: Watch) -> None:
+        for fd in watch.fds:
+            self.selector.unregister(fd)
+
+        watch.close()
+        self.watches.pop(watch.id, None)
+
+    def rescan(self) -> None:
+        ScreenRegistry.reload_if_changed()
+
+        for server in Server.get_registered_servers(read_only=True):
+            if server.autostarts and server.running and server.id not in self.watches \
+                    and server.id not in self.pending:
+                self.watch(server)
+
+    def wait(self, timeout: float) -> list[Watch]:
+        """
+        :return: the watches of which a process exited within `timeout` seconds
+        """
+        if self.use_pidfd and self.watches:
+            events = self.selector.select(timeout)
+            return list({id(key.data): key.data for key, _ in events}.values())
+
+        time.sleep(min(timeout, self.FALLBACK_POLL_INTERVAL))
+        return [w for w in self.watches.values() if not w.alive]
+
+    def handle_exit(self, watch: Watch) -> None:
+        if watch.alive:
+            return
+
+        self.unwatch(watch)
+
+        try:
+            server = Server(watch.path, read_only=True)
+        except FileNotFoundError:
+            return
+
+        last_stop = int(server.data.get("last-stop", "0"))
+
+        if last_stop >= int(watch.since) or not server.autostarts or stopped_cleanly(watch.path):
+            self.log(server.id, "stopped")
+            return
+
+        self.record_crash(server, watch.path, "crashed")
+
+    def record_crash(self, server: Server, path: str, reason: str) -> None:
+        """
+        Counts a crash and schedules a restart with exponential backoff, or gives up on a crash loop
+        """
+        now = time.time()
+        crashes = [t for t in self.crashes.get(server.id, []) if now - t < self.crash_window] + [now]
+        self.crashes[server.id] = crashes
+
+        server.data["last-crash"] = str(int(now))
+
+        if len(crashes) >= self.crash_limit:
+            server.data["crash-loop"] = "true"
+            server.save_data()
+            self.log(server.id, f"{Fore.RED}{reason} {len(crashes)} times within {self.crash_window:.0f}s, giving up"
+                                f"{Fore.RESET}")
+            return
+
+        server.save_data()
+
+        delay = min(self.max_backoff, self.backoff * 2 ** (len(crashes) - 1))
+        self.pending[server.id] = path, time.monotonic() + delay
+        self.log(server.id, f"{Fore.YELLOW}{reason}, restarting in {delay:.0f}s{Fore.RESET}")
+
+    def restart_due(self) -> None:
+        now = time.monotonic()
+
+        for server_id, (path, due) in list(self.pending.items()):
+            if due > now:
+                continue
+
+            del self.pending[server_id]
+
+            try:
+                server = Server(path)
+            except FileNotFoundError:
+                continue
+
+            try:
+                if not server.running:
+                    server.start()
+
+                server.data["restarts"] = str(int(server.data.get("restarts", "0")) + 1)
+                server.save_data()
+            except Exception as e:
+                self.log(server_id, f"{Fore.RED}restart failed: {e}{Fore.RESET}")
+
+            # a restart that didn't come up counts as another crash, so the crash loop limit still applies
+            if not server.running:
+                self.record_crash(server, path, "restart failed")
+                continue
+
+            self.watch(server)
+            self.log(server_id, "restarted")
+
+    def next_timeout(self, next_rescan: float) -> float:
+        due = [next_rescan, *(d for _, d in self.pending.values())]
+        return max(0.0, min(due) - time.monotonic())
+
+    def run(self, stop_after: Optional[float] = None) -> None:
+        end = time.monotonic() + stop_after if stop_after else None
+        next_rescan = 0.0
+
+        try:
+            while end is None or time.monotonic() < end:
+                if time.monotonic() >= next_rescan:
+                    self.rescan()
+                    next_rescan = time.monotonic() + self.rescan_interval
+
+                for watch in self.wait(self.next_timeout(next_rescan)):
+                    self.handle_exit(watch)
+
+                self.restart_due()
+        finally:
+            for watch in list(self.watches.values()):
+                self.unwatch(watch)
+
+            self.selector.close()
@@ -1,10 +1,14 @@
+import csv
+import json
 import os
 import pathlib
+import pwd
 import re
 import subprocess
+import tempfile
+from typing import Iterable, Optional
 
 import click
-import tabulate
 from click import echo
 from colorama import Fore, Style
 
@@ -30,27 +34,85 @@ class Screen:
 
         subprocess.run(["screen", "-S", str(self), "-p", "0", "-X", "stuff", cmd])
 
-    def get_last_stdout_lines(self) -> str:
-        tmp_file = ".screen_out.tmp"
-        subprocess.run(["screen", "-S", str(self), "-p", "0", "-X", "hardcopy", tmp_file])
+    def send_commands(self, cmds: Iterable[str]) -> None:
+        self.send_command("".join(f"{cmd}^M" for cmd in cmds), execute=False)
 
-        with open(tmp_file) as f:
-            lines = f.readlines()
+    def get_last_stdout_lines(self) -> list[str]:
+        fd, tmp_file = tempfile.mkstemp(prefix="mcsrv-screen-", suffix=".tmp")
+        os.close(fd)
 
-        return lines
+        try:
+            subprocess.run(["screen", "-S", str(self), "-p", "0", "-X", "hardcopy", tmp_file])
 
+            with open(tmp_file) as f:
+                return f.readlines()
+        finally:
+            os.remove(tmp_file)
 
-def get_running_screens() -> list[Screen]:
-    screen_dir = pathlib.Path(f"/run/screen/S-{os.getlogin()}")
 
-    if not screen_dir.is_dir():
-        return []
+class ScreenRegistry:
+    """
+    Process-wide index of the running mcsrv screen sessions by name
+
+    The screen socket directory is scanned once and reused by every server until `invalidate` is called, which has to
+    happen after sessions were started or stopped. Long-running processes use `reload_if_changed` instead, which
+    rescans when the mtime of the socket directory changed, as it does whenever a session is created or removed.
+    """
+    _screens: Optional[dict[str, Screen]] = None
+    _mtime: Optional[int] = None
+
+    @staticmethod
+    def _screen_dir() -> pathlib.Path:
+        return pathlib.Path(f"/run/screen/S-{pwd.getpwuid(os.getuid()).pw_name}")
+
+    @classmethod
+    def _dir_mtime(cls) -> Optional[int]:
+        try:
+            return os.stat(cls._screen_dir()).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def _scan(cls) -> dict[str, Screen]:
+        screen_dir = cls._screen_dir()
+
+        if not screen_dir.is_dir():
+            return {}
+
+        screens = (Screen(s.name) for s in screen_dir.glob("*.mc-*"))
+        return {screen.name: screen for screen in screens}
+
+    @classmethod
+    def screens(cls) -> dict[str, Screen]:
+        # read into a local, another thread may invalidate the class attribute at any time
+        screens = cls._screens
+
+        if screens is None:
+            cls._mtime = cls._dir_mtime()
+            screens = cls._screens = cls._scan()
+
+        return screens
+
+    @classmethod
+    def get(cls, name: str) -> Optional[Screen]:
+        return cls.screens().get(name)
 
-    return [Screen(s.name) for s in screen_dir.glob("*.mc-*")]
+    @classmethod
+    def invalidate(cls) -> None:
+        cls._screens = None
 
+    @classmethod
+    def reload_if_changed(cls) -> None:
+        if cls._dir_mtime() != cls._mtime:
+            cls._screens = None
 
-XMX_GM = re.compile(r"[0-9]+G|M")
-XMX_G = re.compile(r"[0-9]+")
+
+def get_running_screens() -> list[Screen]:
+    return list(ScreenRegistry.screens().values())
+
+
+XMX_GM = re.compile(r"^[0-9]+[GM]$")
+XMX_G = re.compile(r"^[0-9]+$")
 
 
 def check_ram_argument(i: str, echo_: bool = True) -> str:
@@ -99,10 +161,36 @@ def print_warning(s: str, id_: str):
 
 
 def format_server_info(v: dict[str, str]) -> str:
+    import tabulate
+
     return "Information:\n" + tabulate.tabulate(([f"{Style.BRIGHT}{k}:{Style.RESET_ALL}", v] for k, v in v.items()),
                                                 tablefmt="plain")
 
 
+def write_records(records: Iterable[dict], fmt: str, fields: list[str]) -> None:
+    """
+    Writes records as json, ndjson or csv to stdout. ndjson and csv rows are written as soon as they are produced.
+    """
+    if fmt == "json":
+        click.echo(json.dumps(list(records)))
+        return
+
+    if fmt == "csv":
+        out = click.get_text_stream("stdout")
+        writer = csv.DictWriter(out, fields, extrasaction="ignore")
+        writer.writeheader()
+
+        for record in records:
+            writer.writerow(record)
+            out.flush()
+
+        return
+
+    for record in records:
+        click.echo(json.dumps(record))
+        click.get_text_stream("stdout").flush()
+
+
 def format_enabled(enabled: bool) -> str:
     return f"{Style.BRIGHT}{'enabled' if enabled else 'disabled'}{Style.RESET_ALL}"
 
@@ -0,0 +1,159 @@
+import json
+import mmap
+import os
+import pathlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .server import Server
+
+SECTOR_SIZE = 4096
+HEADER_SIZE = 2 * SECTOR_SIZE
+CHUNKS_PER_REGION = 1024
+LOCATIONS = struct.Struct(">1024I")
+TIMESTAMPS = struct.Struct(">1024I")
+WORLD_INDEX_DIR = pathlib.Path("~/.mcsrvworlds").expanduser()
+
+
+def read_locations(header: bytes) -> list[tuple[int, int]]:
+    """
+    Parses the location table of an Anvil region file
+
+    :param header: at least the first 4 KiB of the region file
+    :return: (sector offset, sector count) of all 1024 chunks, (0, 0) for chunks that haven't been generated
+    """
+    return [(entry >> 8, entry & 0xff) for entry in LOCATIONS.unpack_from(header, 0)]
+
+
+def chunk_boundaries(header: bytes, size: int) -> list[int]:
+    """
+    :return: sorted byte offsets at which the region file can be split into its header and its chunks
+    """
+    offsets = {0, min(HEADER_SIZE, size)}
+
+    for offset, count in read_locations(header):
+        if count and offset * SECTOR_SIZE < size:
+            offsets.add(offset * SECTOR_SIZE)
+
+    return sorted(offsets)
+
+
+def get_world_dirs(server: "Server") -> list[pathlib.Path]:
+    """
+    :return: the directories of the server world, including the separate dimension directories used by Bukkit servers
+    """
+    level = server.properties.get_value("level-name") if "level-name" in server.properties else ""
+    level = level or "world"
+
+    dirs = [server.path.joinpath(name) for name in (level, f"{level}_nether", f"{level}_the_end")]
+    return [d for d in dirs if d.is_dir()]
+
+
+class RegionInfo(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    chunks: int
+    last_modified: int
+
+
+def scan_region(path: pathlib.Path, rel: str) -> RegionInfo:
+    """
+    Reads the chunk count and the newest chunk timestamp of a region file from its header, without decompressing any
+    chunk
+    """
+    st = path.stat()
+    chunks = last_modified = 0
+
+    if st.st_size >= HEADER_SIZE:
+        with path.open("rb") as f, mmap.mmap(f.fileno(), HEADER_SIZE, access=mmap.ACCESS_READ) as header:
+            chunks = sum(1 for _, count in read_locations(header) if count)
+            last_modified = max(TIMESTAMPS.unpack_from(header, SECTOR_SIZE))
+
+    return RegionInfo(rel, st.st_size, st.st_mtime_ns, chunks, last_modified)
+
+
+class WorldIndex:
+    """
+    Cached per-region statistics of the world of a server
+
+    The index is stored in ~/.mcsrvworlds/<id>.json. Region files whose size and mtime are unchanged are taken from it,
+    all others are scanned in parallel.
+    """
+
+    def __init__(self, server: "Server"):
+        self.server: "Server" = server
+        self.path: pathlib.Path = WORLD_INDEX_DIR.joinpath(f"{server.id}.json")
+
+    def _load(self) -> dict[str, RegionInfo]:
+        try:
+            with self.path.open("r") as f:
+                return {e[0]: RegionInfo(*e) for e in json.load(f)}
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _save(self, regions: list[RegionInfo]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+
+        with tmp.open("w") as f:
+            json.dump([list(r) for r in regions], f)
+
+        os.replace(tmp, self.path)
+
+    def regions(self, workers: Optional[int] = None) -> list[RegionInfo]:
+        cached = self._load()
+        out = []
+        to_scan = []
+
+        for world in get_world_dirs(self.server):
+            for path in world.rglob("*.mca"):
+                rel = str(path.relative_to(self.server.path))
+                st = path.stat()
+                entry = cached.get(rel)
+
+                if entry and entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns:
+                    out.append(entry)
+                else:
+                    to_scan.append((path, rel))
+
+        if to_scan:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                out.extend(pool.map(lambda x: scan_region(*x), to_scan))
+
+        out.sort(key=lambda r: r.path)
+
+        if to_scan or len(out) != len(cached):
+            self._save(out)
+
+        return out
+
+
+def summarize_regions(regions: list[RegionInfo]) -> dict[str, tuple[int, int, int]]:
+    """
+    :return: region count, chunk count and size of every region directory
+    """
+    out = {}
+
+    for region in regions:
+        key = os.path.dirname(region.path)
+        count, chunks, size = out.get(key, (0, 0, 0))
+        out[key] = count + 1, chunks + region.chunks, size + region.size
+
+    return out
+
+
+def get_world_size(server: "Server") -> int:
+    total = 0
+
+    for world in get_world_dirs(server):
+        for root, _, files in os.walk(world):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+
+    return total
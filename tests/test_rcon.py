@@ -0,0 +1,119 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from mcsrv.rcon import PACKET_COMMAND, PACKET_LOGIN, RconClient, RconConnectError
+
+PASSWORD = "secret"
+FRAGMENT_SIZE = 4096
+
+
+def _packet(request_id: int, packet_type: int, payload: bytes) -> bytes:
+    body = struct.pack("<ii", request_id, packet_type) + payload + b"\x00\x00"
+    return struct.pack("<i", len(body)) + body
+
+
+def _read_packet(conn: socket.socket) -> tuple[int, int, bytes]:
+    length, = struct.unpack("<i", conn.recv(4, socket.MSG_WAITALL))
+    body = conn.recv(length, socket.MSG_WAITALL)
+    request_id, packet_type = struct.unpack("<ii", body[:8])
+    return request_id, packet_type, body[8:-2]
+
+
+class FakeRconServer:
+    """
+    Answers commands like a vanilla server: responses are split into 4096 byte packets, requests of unknown type get a
+    single "Unknown request" packet, and the reply is written in small chunks to exercise the reassembly
+    """
+
+    def __init__(self, responses: dict[bytes, bytes]):
+        self.responses: dict[bytes, bytes] = responses
+        self.connections: int = 0
+        self.commands: list[bytes] = []
+        self.sock: socket.socket = socket.create_server(("127.0.0.1", 0))
+        self.port: int = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            request_id, packet_type, payload = _read_packet(conn)
+            assert packet_type == PACKET_LOGIN
+
+            if payload.decode() != PASSWORD:
+                conn.sendall(_packet(-1, PACKET_COMMAND, b""))
+                return
+
+            conn.sendall(_packet(request_id, PACKET_COMMAND, b""))
+
+            while True:
+                try:
+                    request_id, packet_type, payload = _read_packet(conn)
+                except (OSError, struct.error):
+                    return
+
+                if packet_type != PACKET_COMMAND:
+                    conn.sendall(_packet(request_id, 0, f"Unknown request {packet_type:x}".encode()))
+                    continue
+
+                self.commands.append(payload)
+                response = self.responses.get(payload, b"")
+                data = b"".join(_packet(request_id, 0, response[i:i + FRAGMENT_SIZE])
+                                for i in range(0, len(response), FRAGMENT_SIZE))
+
+                for i in range(0, len(data), 1000):
+                    conn.sendall(data[i:i + 1000])
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+@pytest.fixture
+def server():
+    srv = FakeRconServer({b"list": b"x" * 9000, b"seed": b"Seed: [42]"})
+    yield srv
+    srv.close()
+
+
+def test_fragmented_response(server):
+    client = RconClient("127.0.0.1", server.port, PASSWORD)
+
+    try:
+        assert client.command("list") == "x" * 9000
+    finally:
+        client.close()
+
+
+def test_connection_reuse(server):
+    client = RconClient("127.0.0.1", server.port, PASSWORD)
+
+    try:
+        assert client.command("list") == "x" * 9000
+        assert client.command("seed") == "Seed: [42]"
+        assert client.command("say hi") == ""
+    finally:
+        client.close()
+
+    assert server.connections == 1
+    assert server.commands == [b"list", b"seed", b"say hi"]
+
+
+def test_auth_failure(server):
+    client = RconClient("127.0.0.1", server.port, "wrong")
+
+    with pytest.raises(RconConnectError):
+        client.command("list")
+
+    assert not client.connected
+    assert server.commands == []